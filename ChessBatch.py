@@ -0,0 +1,127 @@
+"""Batch legal move generation over many FEN strings.
+
+Streams (fen, UCI moves, status) results for an iterable of FENs, spread over
+a multiprocessing pool. Input is read lazily and at most `max_pending` chunks
+are in flight, so arbitrarily long streams run in bounded memory.
+
+    python ChessBatch.py positions.txt               # one FEN per line, JSON lines out
+    cat positions.txt | python ChessBatch.py - -j 8 --unordered
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import queue
+import sys
+from collections import deque
+
+from ChessEngine import GameState, BACKENDS
+
+DEFAULT_CHUNKSIZE = 256
+
+
+def analyzeFen(fen, backend='bitboard'):
+    # Legal moves and game status for one position; bad FENs are reported, not raised
+    fen = fen.strip()
+    try:
+        gs = GameState.from_fen(fen, backend)
+    except (ValueError, KeyError, IndexError) as e:
+        return {'fen': fen, 'error': str(e)}
+    try:
+        moves = gs.getValidMoves()
+        return {
+            'fen': fen,
+            'moves': [move.getUCINotation() for move in moves],
+            'check': gs.in_check,
+            'checkmate': gs.checkmate,
+            'stalemate': gs.stalemate,
+        }
+    except Exception as e:
+        # A position that parses can still be one move generation cannot handle;
+        # one such FEN must not end the whole stream
+        return {'fen': fen, 'error': f"move generation failed: {e!r}"}
+
+
+def analyzeChunk(fens, backend='bitboard'):
+    return [analyzeFen(fen, backend) for fen in fens]
+
+
+def iterChunks(fens, chunksize):
+    fens = iter(fens)
+    while True:
+        chunk = list(itertools.islice(fens, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def generateMoves(fens, processes=None, chunksize=DEFAULT_CHUNKSIZE, ordered=True,
+                  backend='bitboard', max_pending=None):
+    """Yield analyzeFen results for every FEN in fens.
+
+    ordered=False yields chunks as soon as any worker finishes them. processes=1
+    runs in this process without a pool. max_pending bounds the chunks submitted
+    but not yet yielded (default: four per worker).
+    """
+    processes = processes or multiprocessing.cpu_count()
+    chunks = iterChunks(fens, chunksize)
+    if processes == 1:
+        for chunk in chunks:
+            yield from analyzeChunk(chunk, backend)
+        return
+
+    max_pending = max_pending or processes * 4
+    with multiprocessing.Pool(processes) as pool:
+        if ordered:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(analyzeChunk, (chunk, backend)))
+                if len(pending) >= max_pending:
+                    yield from pending.popleft().get()
+            while pending:
+                yield from pending.popleft().get()
+        else:
+            # Finished chunks (or errors) are pushed here by the pool's result thread
+            done = queue.Queue()
+            in_flight = 0
+            for chunk in chunks:
+                pool.apply_async(analyzeChunk, (chunk, backend),
+                                 callback=done.put, error_callback=done.put)
+                in_flight += 1
+                if in_flight >= max_pending:
+                    yield from _finished(done.get())
+                    in_flight -= 1
+            while in_flight:
+                yield from _finished(done.get())
+                in_flight -= 1
+
+
+def _finished(result):
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List legal moves for many FEN positions")
+    parser.add_argument('input', nargs='?', default='-', help="file with one FEN per line ('-' for stdin)")
+    parser.add_argument('-j', '--processes', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('-c', '--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('-b', '--backend', choices=BACKENDS, default='bitboard')
+    parser.add_argument('--unordered', action='store_true', help="emit results as they finish")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    try:
+        fens = (line for line in source if line.strip())
+        for result in generateMoves(fens, args.processes, args.chunksize,
+                                    not args.unordered, args.backend):
+            sys.stdout.write(json.dumps(result) + '\n')
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
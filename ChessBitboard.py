@@ -0,0 +1,683 @@
+from ChessEngine import (GameState, Move, PROMOTION_CHOICES, EXCHANGE_VALUES, MOVE_PIECES, MOVE_PIECE_CODES,
+                         ZOBRIST_PIECES, ZOBRIST_BLACK_TO_MOVE, ZOBRIST_CASTLING, ZOBRIST_ENPASSANT_FILE)
+
+# Square numbering matches GameState.board: sq = row * 8 + col, a8 = 0, h1 = 63
+FULL = (1 << 64) - 1
+FILE_A = sum(1 << (r * 8) for r in range(8))
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+ROW_2 = 0xFF << 16  # black pawns land here after a single push
+ROW_5 = 0xFF << 40  # white pawns land here after a single push
+PROMOTION_ROWS = 0xFF | 0xFF << 56
+
+SQUARES = [(sq >> 3, sq & 7) for sq in range(64)]
+BIT = [1 << sq for sq in range(64)]
+PROMOTION_FLAGS = [Move.FLAG_PROMOTION + i for i in range(len(PROMOTION_CHOICES))]
+_allocate = object.__new__
+
+
+def _onBoard(r, c):
+    return 0 <= r < 8 and 0 <= c < 8
+
+
+def _stepTable(offsets):
+    table = []
+    for sq in range(64):
+        r, c = SQUARES[sq]
+        mask = 0
+        for dr, dc in offsets:
+            if _onBoard(r + dr, c + dc):
+                mask |= BIT[(r + dr) * 8 + c + dc]
+        table.append(mask)
+    return table
+
+
+def _rayTable(dr, dc):
+    table = []
+    for sq in range(64):
+        r, c = SQUARES[sq]
+        mask = 0
+        r, c = r + dr, c + dc
+        while _onBoard(r, c):
+            mask |= BIT[r * 8 + c]
+            r, c = r + dr, c + dc
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _stepTable([(-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1)])
+KING_ATTACKS = _stepTable([(-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1)])
+# Squares a pawn of the given colour on sq attacks
+PAWN_ATTACKS = {
+    'w': _stepTable([(-1,-1),(-1,1)]),
+    'b': _stepTable([(1,-1),(1,1)]),
+}
+
+# (ray table, positive) pairs; on a positive ray the nearest blocker is the lowest bit
+ROOK_DIRECTIONS = [(_rayTable(-1,0), False), (_rayTable(1,0), True),
+                   (_rayTable(0,-1), False), (_rayTable(0,1), True)]
+BISHOP_DIRECTIONS = [(_rayTable(-1,-1), False), (_rayTable(-1,1), False),
+                     (_rayTable(1,-1), True), (_rayTable(1,1), True)]
+ROOK_EMPTY = [sum(rays[sq] for rays, _ in ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_EMPTY = [sum(rays[sq] for rays, _ in BISHOP_DIRECTIONS) for sq in range(64)]
+
+
+def _betweenTable():
+    # BETWEEN[a][b]: squares strictly between a and b when they share a line, else 0
+    table = [[0] * 64 for _ in range(64)]
+    for rays, positive in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+        for a in range(64):
+            ray = rays[a]
+            while ray:
+                lsb = ray & -ray
+                b = lsb.bit_length() - 1
+                ray ^= lsb
+                table[a][b] = rays[a] & ~rays[b] & ~BIT[b]
+    return table
+
+
+BETWEEN = _betweenTable()
+
+
+def _relevantMask(directions, sq):
+    # Ray squares whose occupancy can change the attack set: the last square of each ray never does
+    mask = 0
+    for rays, positive in directions:
+        ray = rays[sq]
+        if ray:
+            last = (ray & -ray) if not positive else BIT[ray.bit_length() - 1]
+            mask |= ray ^ last
+    return mask
+
+
+def _slidingAttacks(directions, sq, occ):
+    attacks = 0
+    for rays, positive in directions:
+        ray = rays[sq]
+        blockers = ray & occ
+        if blockers:
+            if positive:
+                ray ^= rays[(blockers & -blockers).bit_length() - 1]
+            else:
+                ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+# Attack sets are memoised per square on the relevant occupancy, like magic bitboards
+# with a dict in place of the magic multiply; tables fill as positions are seen
+ROOK_MASKS = [_relevantMask(ROOK_DIRECTIONS, sq) for sq in range(64)]
+BISHOP_MASKS = [_relevantMask(BISHOP_DIRECTIONS, sq) for sq in range(64)]
+ROOK_TABLES = [{} for _ in range(64)]
+BISHOP_TABLES = [{} for _ in range(64)]
+
+
+def rookAttacks(sq, occ):
+    key = occ & ROOK_MASKS[sq]
+    attacks = ROOK_TABLES[sq].get(key)
+    if attacks is None:
+        attacks = ROOK_TABLES[sq][key] = _slidingAttacks(ROOK_DIRECTIONS, sq, key)
+    return attacks
+
+
+def bishopAttacks(sq, occ):
+    key = occ & BISHOP_MASKS[sq]
+    attacks = BISHOP_TABLES[sq].get(key)
+    if attacks is None:
+        attacks = BISHOP_TABLES[sq][key] = _slidingAttacks(BISHOP_DIRECTIONS, sq, key)
+    return attacks
+
+
+def pawnTargets(pawns, white, empty, theirs):
+    # (single pushes, double pushes, left captures, right captures) as target masks
+    if white:
+        single = (pawns >> 8) & empty
+        return (single, ((single & ROW_5) >> 8) & empty,
+                ((pawns & NOT_FILE_A) >> 9) & theirs, ((pawns & NOT_FILE_H) >> 7) & theirs)
+    single = (pawns << 8) & empty
+    return (single, ((single & ROW_2) << 8) & empty,
+            ((pawns & NOT_FILE_A) << 7) & theirs, ((pawns & NOT_FILE_H) << 9) & theirs)
+
+
+def countTargets(targets):
+    # Promotions count once per piece choice
+    return (targets & ~PROMOTION_ROWS).bit_count() + 4 * (targets & PROMOTION_ROWS).bit_count()
+
+
+def newMove(start_sq, end_sq, piece, captured, flags=0):
+    # Move from square numbers and known pieces, skipping Move.__init__'s board lookups
+    move = _allocate(Move)
+    move.start_row, move.start_col = SQUARES[start_sq]
+    move.end_row, move.end_col = SQUARES[end_sq]
+    move.pieces = MOVE_PIECE_CODES[piece] | MOVE_PIECE_CODES[captured] << 4
+    move.flags = flags
+    return move
+
+
+def iterBits(bb):
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+class BitboardGameState(GameState):
+    """GameState backed by 64-bit piece masks.
+
+    The masks and a flat 64-square mailbox are the position: makeMove and
+    undoMove update only those, the Zobrist key and the irreversible state,
+    and no attack maps are kept. self.board is a tuple-of-tuples view rebuilt
+    from the mailbox when it is read after a move, so rendering and notation
+    code is unchanged; writing to it raises TypeError. Assign a whole board
+    and call syncFromBoard() to change the position.
+    """
+
+    def __init__(self, backend='bitboard'):
+        super().__init__(backend)
+        self.syncFromBoard()
+
+    @property
+    def board(self):
+        if self.board_view is None:
+            squares = self.squares
+            self.board_view = tuple(tuple(squares[i:i + 8]) for i in range(0, 64, 8))
+        return self.board_view
+
+    @board.setter
+    def board(self, rows):
+        self.squares = [piece for row in rows for piece in row]
+        self.board_view = None
+
+    def syncFromBoard(self):
+        super().syncFromBoard()
+        self.buildBitboards()
+
+    def restore(self, snapshot):
+        super().restore(snapshot)
+        self.buildBitboards()
+
+    def buildBitboards(self):
+        self.bitboards = {piece: 0 for piece in ('wp','wR','wN','wB','wQ','wK',
+                                                 'bp','bR','bN','bB','bQ','bK')}
+        self.occupancy = {'w': 0, 'b': 0}
+        for sq, piece in enumerate(self.squares):
+            if piece != '--':
+                self.bitboards[piece] |= BIT[sq]
+                self.occupancy[piece[0]] |= BIT[sq]
+
+    def makeMove(self, move):
+        squares = self.squares
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        piece = MOVE_PIECES[move.pieces & 15]
+        captured = MOVE_PIECES[move.pieces >> 4]
+        flags = move.flags
+        color = piece[0]
+        from_sq = move.start_row * 8 + move.start_col
+        to_sq = move.end_row * 8 + move.end_col
+        castling = self.castleRightsIndex()
+        self.move_log.append(move)
+        self.state_log.append((captured, castling, self.enpassantPossible, self.halfmove_clock, self.zobrist_key))
+
+        key = self.zobrist_key ^ ZOBRIST_BLACK_TO_MOVE
+        if self.enpassantPossible:
+            key ^= ZOBRIST_ENPASSANT_FILE[self.enpassantPossible[1]]
+        placed = color + PROMOTION_CHOICES[flags & 3] if flags >= Move.FLAG_PROMOTION else piece
+        squares[from_sq] = '--'
+        squares[to_sq] = placed
+        bitboards[piece] ^= BIT[from_sq]
+        bitboards[placed] ^= BIT[to_sq]
+        occupancy[color] ^= BIT[from_sq] | BIT[to_sq]
+        key ^= ZOBRIST_PIECES[piece][from_sq] ^ ZOBRIST_PIECES[placed][to_sq]
+
+        if captured != '--':
+            if flags == Move.FLAG_ENPASSANT:
+                captured_sq = move.start_row * 8 + move.end_col
+                squares[captured_sq] = '--'
+            else:
+                captured_sq = to_sq
+            bitboards[captured] ^= BIT[captured_sq]
+            occupancy['b' if color == 'w' else 'w'] ^= BIT[captured_sq]
+            key ^= ZOBRIST_PIECES[captured][captured_sq]
+            self.halfmove_clock = 0
+        elif piece[1] == 'p':
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        if flags == Move.FLAG_CASTLE:
+            rook = color + 'R'
+            rook_from, rook_to = (to_sq + 1, to_sq - 1) if to_sq > from_sq else (to_sq - 2, to_sq + 1)
+            squares[rook_from] = '--'
+            squares[rook_to] = rook
+            rook_bits = BIT[rook_from] | BIT[rook_to]
+            bitboards[rook] ^= rook_bits
+            occupancy[color] ^= rook_bits
+            key ^= ZOBRIST_PIECES[rook][rook_from] ^ ZOBRIST_PIECES[rook][rook_to]
+
+        if piece == 'wK':
+            self.white_king_loc = (move.end_row, move.end_col)
+        elif piece == 'bK':
+            self.black_king_loc = (move.end_row, move.end_col)
+        if piece[1] == 'K' or piece[1] == 'R' or captured[1] == 'R':
+            self.updateCastleRights(move)
+            key ^= ZOBRIST_CASTLING[castling] ^ ZOBRIST_CASTLING[self.castleRightsIndex()]
+
+        if piece[1] == 'p' and (to_sq - from_sq == 16 or from_sq - to_sq == 16):
+            self.enpassantPossible = ((move.start_row + move.end_row) // 2, move.end_col)
+            key ^= ZOBRIST_ENPASSANT_FILE[move.end_col]
+        else:
+            self.enpassantPossible = ()
+        self.zobrist_key = key
+        self.board_view = None
+
+        if not self.white_to_move:
+            self.fullmove_number += 1
+        self.white_to_move = not self.white_to_move
+
+    def undoMove(self):
+        if len(self.move_log) == 0:
+            return
+        move = self.move_log.pop()
+        captured, castling, self.enpassantPossible, self.halfmove_clock, self.zobrist_key = self.state_log.pop()
+        squares = self.squares
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        piece = MOVE_PIECES[move.pieces & 15]
+        flags = move.flags
+        color = piece[0]
+        from_sq = move.start_row * 8 + move.start_col
+        to_sq = move.end_row * 8 + move.end_col
+
+        placed = squares[to_sq]
+        squares[from_sq] = piece
+        squares[to_sq] = '--'
+        bitboards[piece] ^= BIT[from_sq]
+        bitboards[placed] ^= BIT[to_sq]
+        occupancy[color] ^= BIT[from_sq] | BIT[to_sq]
+
+        if captured != '--':
+            captured_sq = move.start_row * 8 + move.end_col if flags == Move.FLAG_ENPASSANT else to_sq
+            squares[captured_sq] = captured
+            bitboards[captured] ^= BIT[captured_sq]
+            occupancy['b' if color == 'w' else 'w'] ^= BIT[captured_sq]
+
+        if flags == Move.FLAG_CASTLE:
+            rook = color + 'R'
+            rook_from, rook_to = (to_sq + 1, to_sq - 1) if to_sq > from_sq else (to_sq - 2, to_sq + 1)
+            squares[rook_to] = '--'
+            squares[rook_from] = rook
+            rook_bits = BIT[rook_from] | BIT[rook_to]
+            bitboards[rook] ^= rook_bits
+            occupancy[color] ^= rook_bits
+
+        if piece == 'wK':
+            self.white_king_loc = (move.start_row, move.start_col)
+        elif piece == 'bK':
+            self.black_king_loc = (move.start_row, move.start_col)
+        self.setCastleRights(castling)
+        self.board_view = None
+
+        if self.white_to_move:
+            self.fullmove_number -= 1
+        self.white_to_move = not self.white_to_move
+
+    def attackersTo(self, sq, color, occ):
+        """Mask of color's pieces attacking sq given occupancy occ."""
+        bitboards = self.bitboards
+        enemy = 'b' if color == 'w' else 'w'
+        queens = bitboards[color + 'Q']
+        return ((PAWN_ATTACKS[enemy][sq] & bitboards[color + 'p']) |
+                (KNIGHT_ATTACKS[sq] & bitboards[color + 'N']) |
+                (KING_ATTACKS[sq] & bitboards[color + 'K']) |
+                (rookAttacks(sq, occ) & (bitboards[color + 'R'] | queens)) |
+                (bishopAttacks(sq, occ) & (bitboards[color + 'B'] | queens)))
+
+    def attackedSquares(self, color, occ):
+        """Mask of every square attacked by color given occupancy occ."""
+        bitboards = self.bitboards
+        pawns = bitboards[color + 'p']
+        if color == 'w':
+            attacks = ((pawns & NOT_FILE_A) >> 9) | ((pawns & NOT_FILE_H) >> 7)
+        else:
+            attacks = (((pawns & NOT_FILE_A) << 7) | ((pawns & NOT_FILE_H) << 9)) & FULL
+        for sq in iterBits(bitboards[color + 'N']):
+            attacks |= KNIGHT_ATTACKS[sq]
+        for sq in iterBits(bitboards[color + 'K']):
+            attacks |= KING_ATTACKS[sq]
+        queens = bitboards[color + 'Q']
+        for sq in iterBits(bitboards[color + 'R'] | queens):
+            attacks |= rookAttacks(sq, occ)
+        for sq in iterBits(bitboards[color + 'B'] | queens):
+            attacks |= bishopAttacks(sq, occ)
+        return attacks
+
+    def buildAttackMaps(self):
+        # Attack queries are answered from the masks, so no count maps are kept
+        self.attack_map = None
+
+    def isAttacked(self, square, by_color):
+        occ = self.occupancy['w'] | self.occupancy['b']
+        return self.attackersTo(square[0] * 8 + square[1], by_color, occ) != 0
+
+    def leastValuableAttacker(self, sq, color, removed):
+        # Attacks are recomputed on the reduced occupancy, which uncovers x-ray attackers
+        occ = self.occupancy['w'] | self.occupancy['b']
+        for removed_sq in removed:
+            occ &= ~BIT[removed_sq]
+        attackers = self.attackersTo(sq, color, occ) & occ
+        if attackers:
+            for piece_type in ('p', 'N', 'B', 'R', 'Q', 'K'):
+                found = attackers & self.bitboards[color + piece_type]
+                if found:
+                    return (found & -found).bit_length() - 1, EXCHANGE_VALUES[piece_type]
+        return None
+
+    def checkForPinsAndChecks(self):
+        ally = 'w' if self.white_to_move else 'b'
+        enemy = 'b' if self.white_to_move else 'w'
+        king_row, king_col = self.white_king_loc if self.white_to_move else self.black_king_loc
+        king_sq = king_row * 8 + king_col
+        occ = self.occupancy['w'] | self.occupancy['b']
+        checkers, pinned, pin_rays = self.pinsAndCheckers(ally, enemy, king_sq, occ)
+        pins = []
+        checks = []
+        for sq in iterBits(pinned):
+            r, c = SQUARES[sq]
+            pins.append((r, c) + self.direction(king_sq, sq))
+        for sq in iterBits(checkers):
+            r, c = SQUARES[sq]
+            if KNIGHT_ATTACKS[king_sq] & BIT[sq] and self.squares[sq][1] == 'N':
+                checks.append((r, c, r - king_row, c - king_col))
+            else:
+                checks.append((r, c) + self.direction(king_sq, sq))
+        return checkers != 0, pins, checks
+
+    @staticmethod
+    def direction(from_sq, to_sq):
+        dr = (to_sq >> 3) - (from_sq >> 3)
+        dc = (to_sq & 7) - (from_sq & 7)
+        return ((dr > 0) - (dr < 0), (dc > 0) - (dc < 0))
+
+    def pinsAndCheckers(self, ally, enemy, king_sq, occ):
+        """Return (checkers, pinned, pin_rays) masks for ally's king on king_sq.
+
+        pin_rays maps each pinned square to the mask it may still move along.
+        """
+        bitboards = self.bitboards
+        checkers = self.attackersTo(king_sq, enemy, occ)
+        pinned = 0
+        pin_rays = {}
+        own = self.occupancy[ally]
+        queens = bitboards[enemy + 'Q']
+        snipers = ((ROOK_EMPTY[king_sq] & (bitboards[enemy + 'R'] | queens)) |
+                   (BISHOP_EMPTY[king_sq] & (bitboards[enemy + 'B'] | queens)))
+        for sniper in iterBits(snipers):
+            between = BETWEEN[king_sq][sniper]
+            blockers = between & occ
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned |= blockers
+                pin_rays[blockers.bit_length() - 1] = between | BIT[sniper]
+        return checkers, pinned, pin_rays
+
+    def getAllPossibleMoves(self):
+        """Get all possible moves without considering checks"""
+        moves = []
+        self.generateMoves(moves, legal=False)
+        return moves
+
+    def getValidMoves(self):
+        moves = []
+        self.in_check = self.generateMoves(moves, legal=True)
+        self.pins = []
+        self.checks = []
+        if len(moves) == 0:
+            if self.in_check:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        else:
+            self.checkmate = False
+            self.stalemate = False
+        return moves
+
+    def countMoves(self, first_only=False):
+        # Popcounts of the same target masks generateMoves walks
+        white = self.white_to_move
+        if white:
+            ally, enemy = 'w', 'b'
+            king_row, king_col = self.white_king_loc
+        else:
+            ally, enemy = 'b', 'w'
+            king_row, king_col = self.black_king_loc
+        bitboards = self.bitboards
+        own = self.occupancy[ally]
+        theirs = self.occupancy[enemy]
+        occ = own | theirs
+        empty = ~occ & FULL
+        king_sq = king_row * 8 + king_col
+
+        checkers, pinned, pin_rays = self.pinsAndCheckers(ally, enemy, king_sq, occ)
+        self.in_check = checkers != 0
+        self.pins = []
+        self.checks = []
+        danger = self.attackedSquares(enemy, occ ^ BIT[king_sq])
+        count = (KING_ATTACKS[king_sq] & ~own & ~danger).bit_count()
+        if (count and first_only) or checkers & (checkers - 1):
+            return count
+
+        evasions = FULL
+        if checkers:
+            evasions = BETWEEN[king_sq][checkers.bit_length() - 1] | checkers
+        target = ~own & evasions
+
+        for sq in iterBits(bitboards[ally + 'N'] & ~pinned):
+            count += (KNIGHT_ATTACKS[sq] & target).bit_count()
+        queens = bitboards[ally + 'Q']
+        for pieces, attacks_fn in ((bitboards[ally + 'R'] | queens, rookAttacks),
+                                   (bitboards[ally + 'B'] | queens, bishopAttacks)):
+            for sq in iterBits(pieces):
+                attacks = attacks_fn(sq, occ) & target
+                if BIT[sq] & pinned:
+                    attacks &= pin_rays[sq]
+                count += attacks.bit_count()
+        if count and first_only:
+            return count
+
+        # Unpinned pawns in bulk, pinned ones one at a time along their pin ray
+        pawns = bitboards[ally + 'p']
+        single, double, left, right = pawnTargets(pawns & ~pinned, white, empty, theirs)
+        count += countTargets((single | double) & evasions) + countTargets(left & evasions) + \
+            countTargets(right & evasions)
+        for sq in iterBits(pawns & pinned):
+            for targets in pawnTargets(BIT[sq], white, empty, theirs):
+                count += countTargets(targets & evasions & pin_rays[sq])
+
+        if self.enpassantPossible:
+            ep_row, ep_col = self.enpassantPossible
+            ep_sq = ep_row * 8 + ep_col
+            captured_sq = (ep_row + (1 if ally == 'w' else -1)) * 8 + ep_col
+            queens = bitboards[enemy + 'Q']
+            for sq in iterBits(PAWN_ATTACKS[enemy][ep_sq] & pawns):
+                after = occ ^ BIT[sq] ^ BIT[ep_sq] ^ BIT[captured_sq]
+                if not ((rookAttacks(king_sq, after) & (bitboards[enemy + 'R'] | queens)) or
+                        (bishopAttacks(king_sq, after) & (bitboards[enemy + 'B'] | queens)) or
+                        (KNIGHT_ATTACKS[king_sq] & bitboards[enemy + 'N']) or
+                        (PAWN_ATTACKS[ally][king_sq] & bitboards[enemy + 'p'] & ~BIT[captured_sq])):
+                    count += 1
+
+        if not checkers:
+            kingside, queenside = self.castlingPaths(ally, king_sq, occ, danger)
+            count += kingside + queenside
+        return count
+
+    def getNoisyMoves(self):
+        moves = []
+        self.generateMoves(moves, quiet=False)
+        return moves
+
+    def getQuietMoves(self):
+        moves = []
+        self.generateMoves(moves, noisy=False)
+        return moves
+
+    def getKingMoves(self, r, c, moves):
+        # Legal king moves, castling included
+        self.generateMoves(moves, origins=BIT[r * 8 + c])
+
+    def kingTargets(self, r, c):
+        # Squares the king on (r, c) can step to safely (castling not included)
+        ally = 'w' if self.white_to_move else 'b'
+        enemy = 'b' if self.white_to_move else 'w'
+        king_sq = r * 8 + c
+        occ = self.occupancy['w'] | self.occupancy['b']
+        danger = self.attackedSquares(enemy, occ ^ BIT[king_sq])
+        return list(iterBits(KING_ATTACKS[king_sq] & ~self.occupancy[ally] & ~danger))
+
+    def getPieceMoves(self, r, c):
+        sq = r * 8 + c
+        piece = self.squares[sq]
+        if piece == '--' or (piece[0] == 'w') != self.white_to_move:
+            return []
+        moves = []
+        self.generateMoves(moves, origins=BIT[sq])
+        return moves
+
+    def generateMoves(self, moves, legal=True, noisy=True, quiet=True, origins=FULL):
+        """Append moves for the side to move and return whether it is in check.
+
+        With legal=False pins and checks are ignored (king moves are still
+        restricted to squares not attacked by the opponent). noisy=False skips
+        captures and promotions, quiet=False skips everything else. Only pieces
+        on squares in the origins mask are moved.
+        """
+        squares = self.squares
+        if self.white_to_move:
+            ally, enemy = 'w', 'b'
+            king_row, king_col = self.white_king_loc
+        else:
+            ally, enemy = 'b', 'w'
+            king_row, king_col = self.black_king_loc
+        bitboards = self.bitboards
+        own = self.occupancy[ally]
+        theirs = self.occupancy[enemy]
+        occ = own | theirs
+        king_sq = king_row * 8 + king_col
+        append = moves.append
+
+        checkers, pinned, pin_rays = self.pinsAndCheckers(ally, enemy, king_sq, occ)
+        in_check = checkers != 0
+        if not legal:
+            pinned = 0
+        # Squares the king may not step on; the king itself is removed so it
+        # cannot hide behind itself along a checking ray.
+        danger = self.attackedSquares(enemy, occ ^ BIT[king_sq])
+        empty = ~occ & FULL
+        kinds = (theirs if noisy else 0) | (empty if quiet else 0)
+
+        king = ally + 'K'
+        king_moves = BIT[king_sq] & origins
+        if king_moves:
+            for to in iterBits(KING_ATTACKS[king_sq] & kinds & ~danger):
+                append(newMove(king_sq, to, king, squares[to]))
+
+        if legal and checkers & (checkers - 1):
+            return in_check  # Double check, only the king may move
+
+        evasions = FULL
+        if legal and checkers:
+            checker_sq = checkers.bit_length() - 1
+            evasions = BETWEEN[king_sq][checker_sq] | checkers
+        target = kinds & evasions
+
+        # Knights
+        knight = ally + 'N'
+        for sq in iterBits(bitboards[knight] & ~pinned & origins):
+            for to in iterBits(KNIGHT_ATTACKS[sq] & target):
+                append(newMove(sq, to, knight, squares[to]))
+
+        # Sliders
+        queens = bitboards[ally + 'Q']
+        for pieces, attacks_fn in ((bitboards[ally + 'R'] | queens, rookAttacks),
+                                   (bitboards[ally + 'B'] | queens, bishopAttacks)):
+            for sq in iterBits(pieces & origins):
+                attacks = attacks_fn(sq, occ) & target
+                if BIT[sq] & pinned:
+                    attacks &= pin_rays[sq]
+                piece = squares[sq]
+                for to in iterBits(attacks):
+                    append(newMove(sq, to, piece, squares[to]))
+
+        # Pawns
+        pawn = ally + 'p'
+        pawns = bitboards[pawn] & origins
+        if ally == 'w':
+            single = (pawns >> 8) & empty
+            double = ((single & ROW_5) >> 8) & empty
+            left = ((pawns & NOT_FILE_A) >> 9) & theirs
+            right = ((pawns & NOT_FILE_H) >> 7) & theirs
+            shifts = ((single, 8), (double, 16), (left, 9), (right, 7))
+        else:
+            single = (pawns << 8) & empty
+            double = ((single & ROW_2) << 8) & empty
+            left = ((pawns & NOT_FILE_A) << 7) & theirs
+            right = ((pawns & NOT_FILE_H) << 9) & theirs
+            shifts = ((single, -8), (double, -16), (left, -7), (right, -9))
+        # Pushes onto the last row are promotions and count as noisy
+        push_target = evasions & ((PROMOTION_ROWS if noisy else 0) | (~PROMOTION_ROWS & FULL if quiet else 0))
+        for i, (targets, offset) in enumerate(shifts):
+            for to in iterBits(targets & (push_target if i < 2 else target)):
+                sq = to + offset
+                if BIT[sq] & pinned and not BIT[to] & pin_rays[sq]:
+                    continue
+                if BIT[to] & PROMOTION_ROWS:
+                    for flags in PROMOTION_FLAGS:
+                        append(newMove(sq, to, pawn, squares[to], flags))
+                else:
+                    append(newMove(sq, to, pawn, squares[to]))
+
+        # En passant is tested explicitly: removing two pawns from one rank
+        # can expose the king in ways the pin masks do not describe.
+        if self.enpassantPossible and noisy:
+            ep_row, ep_col = self.enpassantPossible
+            ep_sq = ep_row * 8 + ep_col
+            captured_sq = (ep_row + (1 if ally == 'w' else -1)) * 8 + ep_col
+            for sq in iterBits(PAWN_ATTACKS[enemy][ep_sq] & pawns):
+                if legal:
+                    after = occ ^ BIT[sq] ^ BIT[ep_sq] ^ BIT[captured_sq]
+                    queens = bitboards[enemy + 'Q']
+                    if ((rookAttacks(king_sq, after) & (bitboards[enemy + 'R'] | queens)) or
+                            (bishopAttacks(king_sq, after) & (bitboards[enemy + 'B'] | queens)) or
+                            (KNIGHT_ATTACKS[king_sq] & bitboards[enemy + 'N']) or
+                            (PAWN_ATTACKS[ally][king_sq] & bitboards[enemy + 'p'] & ~BIT[captured_sq])):
+                        continue
+                append(newMove(sq, ep_sq, pawn, enemy + 'p', Move.FLAG_ENPASSANT))
+
+        # Castling
+        if not in_check and quiet and king_moves:
+            kingside, queenside = self.castlingPaths(ally, king_sq, occ, danger)
+            if kingside:
+                append(newMove(king_sq, king_sq + 2, king, '--', Move.FLAG_CASTLE))
+            if queenside:
+                append(newMove(king_sq, king_sq - 2, king, '--', Move.FLAG_CASTLE))
+        return in_check
+
+    def castlingPaths(self, ally, king_sq, occ, danger):
+        # (kingside, queenside): whether each castle is allowed, given the king is not in check
+        bitboards = self.bitboards
+        if ally == 'w':
+            if king_sq != 60:
+                return False, False
+            kingside, queenside = self.white_castle_kingside, self.white_castle_queenside
+        else:
+            if king_sq != 4:
+                return False, False
+            kingside, queenside = self.black_castle_kingside, self.black_castle_queenside
+        rooks = bitboards[ally + 'R']
+        path = BIT[king_sq + 1] | BIT[king_sq + 2]
+        kingside = kingside and rooks & BIT[king_sq + 3] and not path & occ and not path & danger
+        path = BIT[king_sq - 1] | BIT[king_sq - 2]
+        queenside = queenside and rooks & BIT[king_sq - 4] and \
+            not (path | BIT[king_sq - 3]) & occ and not path & danger
+        return bool(kingside), bool(queenside)
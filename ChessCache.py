@@ -0,0 +1,143 @@
+"""Two-tier cache of engine analyses keyed by Zobrist key and search parameters.
+
+An in-process LRU sits in front of an optional SQLite file shared across runs.
+A stored Analysis is reused only when it was searched at least as deep as the
+caller asks for, and a deeper result for the same key replaces a shallower one.
+
+    cache = AnalysisCache('analysis_cache.sqlite3')
+    cache.put(gs.zobrist_key, 'native', analysis)
+    analysis = cache.get(gs.zobrist_key, 'native', min_depth=4)
+"""
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from ChessUCI import Analysis, AnalysisLine
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis (
+    zobrist_key INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    best_move TEXT,
+    ponder TEXT,
+    lines TEXT NOT NULL,
+    PRIMARY KEY (zobrist_key, params)
+)
+"""
+
+
+def _signed(key):
+    # SQLite integers are signed 64-bit; Zobrist keys are unsigned
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def encodeLines(lines):
+    return json.dumps([list(line) for line in lines])
+
+
+def decodeLines(text):
+    return [AnalysisLine(*line) for line in json.loads(text)]
+
+
+class AnalysisCache():
+    """LRU of up to capacity analyses, backed by an SQLite file when path is given.
+
+    The file is opened on first use, not on construction. Safe to share between
+    threads; all access goes through one lock.
+    """
+
+    def __init__(self, path=None, capacity=4096):
+        self.capacity = capacity
+        self.memory = OrderedDict()  # (zobrist_key, params) -> Analysis
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.path = path
+        self.db = None
+        self.opened = False  # set once opening the file has been tried
+
+    def _connect(self):
+        # Open the SQLite file on first use; if it cannot be opened the cache stays in memory
+        if self.opened:
+            return
+        self.opened = True
+        if not self.path:
+            return
+        try:
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(SCHEMA)
+            self.db.commit()
+        except sqlite3.Error as e:
+            print(f"Analysis cache unavailable ({e}), keeping it in memory")
+            if self.db is not None:
+                self.db.close()
+            self.db = None
+
+    def get(self, zobrist_key, params, min_depth=0):
+        # The cached Analysis if it was searched to at least min_depth, else None
+        key = (zobrist_key, params)
+        with self.lock:
+            self._connect()
+            analysis = self.memory.get(key)
+            if analysis is not None:
+                self.memory.move_to_end(key)
+            if (analysis is None or analysis.depth < min_depth) and self.db is not None:
+                # Another run may have stored a deeper result since this one was loaded
+                row = self.db.execute(
+                    "SELECT best_move, ponder, depth, lines FROM analysis WHERE zobrist_key = ? AND params = ?",
+                    (_signed(zobrist_key), params)).fetchone()
+                if row is not None and (analysis is None or row[2] > analysis.depth):
+                    analysis = Analysis(row[0], row[1], row[2], decodeLines(row[3]))
+                    self._remember(key, analysis)
+            if analysis is None or analysis.depth < min_depth:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return analysis
+
+    def put(self, zobrist_key, params, analysis):
+        # Store analysis unless a deeper one is already cached for this key
+        if analysis.best_move is None:
+            return
+        key = (zobrist_key, params)
+        with self.lock:
+            self._connect()
+            cached = self.memory.get(key)
+            if cached is not None and cached.depth > analysis.depth:
+                return
+            self._remember(key, analysis)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT INTO analysis (zobrist_key, params, depth, best_move, ponder, lines)"
+                    " VALUES (?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (zobrist_key, params) DO UPDATE SET depth = excluded.depth,"
+                    " best_move = excluded.best_move, ponder = excluded.ponder, lines = excluded.lines"
+                    " WHERE excluded.depth >= analysis.depth",
+                    (_signed(zobrist_key), params, analysis.depth, analysis.best_move,
+                     analysis.ponder, encodeLines(analysis.lines)))
+                self.db.commit()
+
+    def _remember(self, key, analysis):
+        self.memory[key] = analysis
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self._connect()
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM analysis")
+                self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.opened = True
+            if self.db is not None:
+                self.db.close()
+                self.db = None
@@ -0,0 +1,355 @@
+"""KPK, KRK and KQK endgame bitbases, generated locally by retrograde analysis.
+
+The generator works backwards from every checkmate using ChessEngine's square
+tables, so nothing has to be downloaded. Results are written as bit-packed
+files: KPK stores one win/draw bit per position, KRK and KQK store the
+distance to mate in 6 bits. EndgameTablebase memory-maps the files and
+answers a probe with one table read.
+
+    python ChessEndgame.py generate                       # writes bitbases/kqk.bb, krk.bb, kpk.bb
+    python ChessEndgame.py probe --fen "8/8/8/4k3/8/8/8/KR6 w - - 0 1"
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+from ChessEngine import GameState, BETWEEN, KING_TARGETS, PAWN_TARGETS, RAYS, SLIDER_DIRECTIONS
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bitbases')
+TABLES = ('kqk', 'krk', 'kpk')  # in generation order: KPK promotions look up KQK and KRK
+TABLE_PIECES = {'kqk': 'Q', 'krk': 'R', 'kpk': 'p'}
+TABLE_BITS = {'kqk': 6, 'krk': 6, 'kpk': 1}
+
+# File header: magic, format version, bits per entry, entry count
+HEADER = struct.Struct('<4sBBxxI')
+MAGIC = b'CEBB'
+VERSION = 1
+
+# Positions are indexed with the strong side as white:
+#   index = ((side * 64 + strong_king) * 64 + weak_king) * piece_squares + piece_index
+# side 0 = strong side to move. A table value of 0 is a draw (or an illegal
+# position); v > 0 means the strong side mates in v - 1 plies.
+STRONG_TO_MOVE, WEAK_TO_MOVE = 0, 1
+KING_NEIGHBOURS = [frozenset(targets) for targets in KING_TARGETS]
+PAWN_ATTACKS = [frozenset(targets) for targets in PAWN_TARGETS['w']]
+UNRESOLVED_ESCAPE = 255  # weak-side move counter of a position that can capture the strong piece
+
+
+def pieceSquares(piece):
+    # Squares the strong piece can stand on; a pawn never stands on the first or last rank
+    return list(range(8, 56)) if piece == 'p' else list(range(64))
+
+
+def attackTable(piece):
+    # attacks(x, target, blocker): does the piece on x attack target with only blocker in the way
+    if piece == 'p':
+        return lambda x, target, blocker: target in PAWN_ATTACKS[x]
+    aligned = [frozenset(sq for d in SLIDER_DIRECTIONS[piece] for sq in RAYS[d][x]) for x in range(64)]
+    return lambda x, target, blocker: target in aligned[x] and blocker not in BETWEEN[x][target]
+
+
+def generateTable(piece, promotion_tables=None):
+    """Retrograde analysis of K + piece against K; returns a bytearray of table values.
+
+    promotion_tables maps 'Q' and 'R' to finished KQK and KRK tables and is
+    needed for KPK. KPK values only mean won (> 0) or not: promotions enter
+    the search at their KQK/KRK distance, so its distances are not exact.
+    """
+    squares = pieceSquares(piece)
+    n = len(squares)
+    index_of = {sq: i for i, sq in enumerate(squares)}
+    half = 64 * 64 * n
+    value = bytearray(2 * half)
+    legal = bytearray(2 * half)
+    count = bytearray(2 * half)  # weak to move: king moves not yet known to lose
+    attacks = attackTable(piece)
+    directions = () if piece == 'p' else SLIDER_DIRECTIONS[piece]
+    frontier = []
+
+    for sk in range(64):
+        for wk in range(64):
+            if wk == sk or wk in KING_NEIGHBOURS[sk]:
+                continue
+            for i, x in enumerate(squares):
+                if x == sk or x == wk:
+                    continue
+                base = (sk * 64 + wk) * n + i
+                in_check = attacks(x, wk, sk)
+                if not in_check:
+                    legal[base] = 1  # With the strong side to move the weak king must not be in check
+                weak = half + base
+                legal[weak] = 1
+                moves = 0
+                escape = False
+                for t in KING_TARGETS[wk]:
+                    if t == sk or t in KING_NEIGHBOURS[sk]:
+                        continue
+                    if t == x:
+                        escape = escape or x not in KING_NEIGHBOURS[sk]
+                    elif not attacks(x, t, sk):
+                        moves += 1
+                if escape:
+                    count[weak] = UNRESOLVED_ESCAPE  # Taking the piece draws, so this is never lost
+                elif moves:
+                    count[weak] = moves
+                elif in_check:
+                    value[weak] = 1  # Checkmated
+                    frontier.append(weak)
+
+    if piece == 'p':
+        # Seed wins from promotions: the promoted position, weak side to move, is lost in KQK/KRK
+        for sk in range(64):
+            for wk in range(64):
+                for x in range(8, 16):
+                    base = (sk * 64 + wk) * n + index_of[x]
+                    if not legal[base] or x - 8 in (sk, wk):
+                        continue
+                    for promoted in ('Q', 'R'):
+                        table = promotion_tables[promoted]
+                        if table[64 * 64 * 64 + (sk * 64 + wk) * 64 + x - 8]:
+                            value[base] = 1
+                            frontier.append(base)
+                            break
+
+    while frontier:
+        next_frontier = []
+        for index in frontier:
+            v = min(value[index] + 1, 255)
+            side, base = divmod(index, half)
+            rest, i = divmod(base, n)
+            sk, wk = divmod(rest, 64)
+            x = squares[i]
+            if side == WEAK_TO_MOVE:
+                # Lost for the weak side: every strong move into it wins
+                for sk_from in KING_TARGETS[sk]:
+                    if sk_from == wk or sk_from == x or sk_from in KING_NEIGHBOURS[wk]:
+                        continue
+                    prev = (sk_from * 64 + wk) * n + i
+                    if legal[prev] and not value[prev]:
+                        value[prev] = v
+                        next_frontier.append(prev)
+                if piece == 'p':
+                    origins = []
+                    if x + 8 < 56 and x + 8 != sk and x + 8 != wk:
+                        origins.append(x + 8)
+                        if 32 <= x < 40 and x + 16 != sk and x + 16 != wk:
+                            origins.append(x + 16)  # Double push from the second rank
+                else:
+                    origins = []
+                    for d in directions:
+                        for x_from in RAYS[d][x]:
+                            if x_from == sk or x_from == wk:
+                                break
+                            origins.append(x_from)
+                for x_from in origins:
+                    prev = (sk * 64 + wk) * n + index_of[x_from]
+                    if legal[prev] and not value[prev]:
+                        value[prev] = v
+                        next_frontier.append(prev)
+            else:
+                # Won for the strong side: one less escape for each weak position leading here
+                for wk_from in KING_TARGETS[wk]:
+                    if wk_from == sk or wk_from == x or wk_from in KING_NEIGHBOURS[sk]:
+                        continue
+                    prev = half + (sk * 64 + wk_from) * n + i
+                    if value[prev] or count[prev] == UNRESOLVED_ESCAPE:
+                        continue
+                    count[prev] -= 1
+                    if not count[prev]:
+                        value[prev] = v
+                        next_frontier.append(prev)
+        frontier = next_frontier
+    return value
+
+
+def packTable(values, bits):
+    # Little-endian bit packing, one byte of padding so every entry can be read as two bytes
+    data = bytearray((len(values) * bits + 7) // 8 + 1)
+    limit = (1 << bits) - 1
+    for i, v in enumerate(values):
+        if v:
+            v = min(v, limit)
+            pos = i * bits
+            byte, shift = pos >> 3, pos & 7
+            data[byte] |= (v << shift) & 0xFF
+            if shift + bits > 8:
+                data[byte + 1] |= v >> (8 - shift)
+    return HEADER.pack(MAGIC, VERSION, bits, len(values)) + bytes(data)
+
+
+def generateAll(directory=DEFAULT_DIRECTORY, tables=TABLES, verbose=True):
+    # Generate and write the requested tables (with any KPK dependencies) into directory
+    os.makedirs(directory, exist_ok=True)
+    needed = set(tables) | ({'kqk', 'krk'} if 'kpk' in tables else set())
+    generated = {}
+    for name in TABLES:
+        if name not in needed:
+            continue
+        start = time.perf_counter()
+        piece = TABLE_PIECES[name]
+        promotion_tables = {'Q': generated.get('kqk'), 'R': generated.get('krk')}
+        generated[name] = generateTable(piece, promotion_tables)
+        if name in tables:
+            path = os.path.join(directory, name + '.bb')
+            with open(path, 'wb') as out:
+                out.write(packTable(generated[name], TABLE_BITS[name]))
+            if verbose:
+                wins = sum(1 for v in generated[name] if v)
+                print(f"{name}: {len(generated[name])} positions, {wins} won, "
+                      f"longest mate {max(generated[name]) - 1} plies, "
+                      f"{time.perf_counter() - start:.1f}s -> {path}")
+    return generated
+
+
+class EndgameTablebase():
+    """Probes the KPK/KRK/KQK bitbases in directory; tables that were not generated are skipped."""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.tables = {}  # name -> (mmap, bits, entry count)
+        self.files = []
+        for name in TABLES:
+            path = os.path.join(directory, name + '.bb')
+            if not os.path.exists(path):
+                continue
+            handle = open(path, 'rb')
+            data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, bits, entries = HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != VERSION:
+                data.close()
+                handle.close()
+                raise ValueError(f"{path} is not a version {VERSION} bitbase")
+            self.files.append((handle, data))
+            self.tables[name] = (data, bits, entries)
+
+    def __bool__(self):
+        return bool(self.tables)
+
+    def close(self):
+        for handle, data in self.files:
+            data.close()
+            handle.close()
+        self.files = []
+        self.tables = {}
+
+    def read(self, name, index):
+        data, bits, _ = self.tables[name]
+        pos = index * bits
+        byte = HEADER.size + (pos >> 3)
+        return ((data[byte] | data[byte + 1] << 8) >> (pos & 7)) & ((1 << bits) - 1)
+
+    def probe(self, gs):
+        """(wdl, dtm) for the side to move, or None when the position is not covered.
+
+        wdl is 1 (win), 0 (draw) or -1 (loss); dtm is the distance to mate in plies,
+        None for draws and for KPK, which only stores win or draw.
+        """
+        white_king = black_king = strong = square = name = None
+        for r in range(8):
+            for c in range(8):
+                piece = gs.board[r][c]
+                if piece == '--':
+                    continue
+                if piece[1] == 'K':
+                    if piece[0] == 'w':
+                        white_king = (r, c)
+                    else:
+                        black_king = (r, c)
+                    continue
+                if name is not None:
+                    return None  # More than three pieces
+                name = 'k' + piece[1].lower() + 'k'
+                strong = piece[0]
+                square = (r, c)
+        if white_king is None or black_king is None:
+            return None
+        if name in (None, 'kbk', 'knk'):
+            return (0, None)  # Bare kings, or a lone minor piece that cannot mate
+        if name not in self.tables:
+            return None
+        strong_king, weak_king = (white_king, black_king) if strong == 'w' else (black_king, white_king)
+        if strong == 'b':
+            # Mirror the board so the strong side is white
+            strong_king, weak_king, square = [(7 - r, c) for r, c in (strong_king, weak_king, square)]
+        sk, wk, x = (r * 8 + c for r, c in (strong_king, weak_king, square))
+        strong_to_move = gs.white_to_move == (strong == 'w')
+        if name == 'kpk':
+            if not 8 <= x < 56:
+                return None
+            n, i = 48, x - 8
+        else:
+            n, i = 64, x
+        index = ((0 if strong_to_move else 64 * 64) + sk * 64 + wk) * n + i
+        v = self.read(name, index)
+        if not v:
+            return (0, None)
+        dtm = None if name == 'kpk' else v - 1
+        return (1, dtm) if strong_to_move else (-1, dtm)
+
+    def bestMove(self, gs, valid_moves, history=None):
+        """The move that keeps the best result for the side to move, or None if not covered.
+
+        Wins go for the shortest mate, losses for the longest; without distances
+        (KPK) pawn moves come first and positions from history are avoided.
+        """
+        if not valid_moves or self.probe(gs) is None:
+            return None
+        seen = set(gs.positionHistory() if history is None else history)
+        seen.add(gs.zobrist_key)
+        best_move, best_key = None, None
+        for move in valid_moves:
+            gs.makeMove(move)
+            reply = self.probe(gs)
+            repeated = gs.zobrist_key in seen
+            gs.undoMove()
+            if reply is None:
+                continue
+            wdl, dtm = -reply[0], reply[1]
+            if wdl > 0:
+                # A known mate distance (KRK/KQK, or KPK after promoting) beats any KPK move
+                progress = 1000 - dtm if dtm is not None else (move.piece_moved[1] == 'p') * 100 - repeated
+            elif wdl < 0:
+                progress = dtm if dtm is not None else 0
+            else:
+                progress = move.piece_captured != '--'
+            key = (wdl, progress)
+            if best_key is None or key > best_key:
+                best_move, best_key = move, key
+        return best_move
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate or probe KPK/KRK/KQK endgame bitbases")
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate = commands.add_parser('generate', help="build the bitbases by retrograde analysis")
+    generate.add_argument('-d', '--directory', default=DEFAULT_DIRECTORY)
+    generate.add_argument('-t', '--table', action='append', choices=TABLES,
+                          help="table to build (repeatable, default: all)")
+    probe = commands.add_parser('probe', help="look up a position")
+    probe.add_argument('--fen', required=True)
+    probe.add_argument('-d', '--directory', default=DEFAULT_DIRECTORY)
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        generateAll(args.directory, tuple(args.table or TABLES))
+        return 0
+    tablebase = EndgameTablebase(args.directory)
+    gs = GameState.from_fen(args.fen)
+    result = tablebase.probe(gs)
+    if result is None:
+        print("Position not covered by the available bitbases")
+        return 1
+    wdl, dtm = result
+    outcome = {1: 'win', 0: 'draw', -1: 'loss'}[wdl]
+    print(f"{outcome} for the side to move" + (f", mate in {dtm} plies" if dtm is not None else ''))
+    move = tablebase.bestMove(gs, gs.getValidMoves())
+    if move is not None:
+        print(f"best move: {move.getUCINotation()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,98 @@
+import random
+from collections import namedtuple
+
+BACKENDS = ('list', 'bitboard')
+PROMOTION_CHOICES = ('Q', 'R', 'B', 'N')  # Queen first so callers matching on squares get it by default
+FEN_PIECES = {'P': 'wp', 'N': 'wN', 'B': 'wB', 'R': 'wR', 'Q': 'wQ', 'K': 'wK',
+              'p': 'bp', 'n': 'bN', 'b': 'bB', 'r': 'bR', 'q': 'bQ', 'k': 'bK'}
+FEN_SYMBOLS = {piece: symbol for symbol, piece in FEN_PIECES.items()}
+
+# Centipawn values for judging captures
+EXCHANGE_VALUES = {'p': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 20000}
+
+# Immutable, pickleable position: board is 64 bytes of FEN letters ('.' = empty) from a8 to h1,
+# castling is the castleRightsIndex bits, squares are row * 8 + col (enpassant -1 when there is none)
+PositionSnapshot = namedtuple('PositionSnapshot', (
+    'board', 'white_to_move', 'castling', 'enpassant', 'white_king', 'black_king',
+    'halfmove_clock', 'fullmove_number', 'zobrist_key'))
+SNAPSHOT_BYTES = {piece: ord(symbol) for piece, symbol in FEN_SYMBOLS.items()}
+SNAPSHOT_BYTES['--'] = ord('.')
+SNAPSHOT_PIECES = {byte: piece for piece, byte in SNAPSHOT_BYTES.items()}
+
+# Move.pieces holds the moved and captured pieces as 4-bit indexes into MOVE_PIECES
+MOVE_PIECES = ('--', 'wp', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bp', 'bN', 'bB', 'bR', 'bQ', 'bK')
+MOVE_PIECE_CODES = {piece: code for code, piece in enumerate(MOVE_PIECES)}
+
+# Zobrist keys, fixed seed so position keys are stable across runs and processes
+_zobrist_random = random.Random(0x5A0B1257)
+ZOBRIST_PIECES = {piece: [_zobrist_random.getrandbits(64) for _ in range(64)]
+                  for piece in ('wp','wR','wN','wB','wQ','wK','bp','bR','bN','bB','bQ','bK')}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_ENPASSANT_FILE = [_zobrist_random.getrandbits(64) for _ in range(8)]
+# One key per castling flag (K, Q, k, q); ZOBRIST_CASTLING holds the XOR for each 4-bit combination
+_castling_flag_keys = [_zobrist_random.getrandbits(64) for _ in range(4)]
+ZOBRIST_CASTLING = [0] * 16
+for _rights in range(16):
+    for _flag in range(4):
+        if _rights & (1 << _flag):
+            ZOBRIST_CASTLING[_rights] ^= _castling_flag_keys[_flag]
+
+# Attack tables over squares sq = row * 8 + col, built once at import
+DIRECTIONS = ((-1,0),(0,-1),(1,0),(0,1),(-1,-1),(-1,1),(1,-1),(1,1))  # orthogonal first, then diagonal
+SLIDER_DIRECTIONS = {'R': range(0, 4), 'B': range(4, 8), 'Q': range(0, 8)}
+OPPOSITE_DIRECTIONS = (2, 3, 0, 1, 7, 6, 5, 4)
+
+
+def _targets(offsets):
+    return [tuple((r + dr) * 8 + c + dc for dr, dc in offsets if 0 <= r + dr < 8 and 0 <= c + dc < 8)
+            for r in range(8) for c in range(8)]
+
+
+def _ray(r, c, dr, dc):
+    squares = []
+    r, c = r + dr, c + dc
+    while 0 <= r < 8 and 0 <= c < 8:
+        squares.append(r * 8 + c)
+        r, c = r + dr, c + dc
+    return tuple(squares)
+
+
+KNIGHT_TARGETS = _targets(((-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1)))
+KING_TARGETS = _targets(DIRECTIONS)
+PAWN_TARGETS = {'w': _targets(((-1,-1),(-1,1))), 'b': _targets(((1,-1),(1,1)))}
+RAYS = [[_ray(r, c, dr, dc) for r in range(8) for c in range(8)] for dr, dc in DIRECTIONS]
+SQUARE_COORDS = [(sq >> 3, sq & 7) for sq in range(64)]
+
+
+def _lineTables():
+    # BETWEEN[a][b]: squares strictly between two aligned squares; LINE[a][b]: the whole line through both
+    between = [[()] * 64 for _ in range(64)]
+    line = [[None] * 64 for _ in range(64)]
+    for sq in range(64):
+        for d in range(8):
+            ray = RAYS[d][sq]
+            full_line = frozenset(ray + RAYS[OPPOSITE_DIRECTIONS[d]][sq] + (sq,))
+            for i, target in enumerate(ray):
+                between[sq][target] = ray[:i]
+                line[sq][target] = full_line
+    return between, line
+
+
+BETWEEN, LINE = _lineTables()
+
+
 class GameState():
-    def __init__(self):
+    def __new__(cls, backend='list'):
+        # backend='bitboard' builds the mask-based subclass from ChessBitboard
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown GameState backend: {backend}")
+        if cls is GameState and backend == 'bitboard':
+            from ChessBitboard import BitboardGameState
+            cls = BitboardGameState
+        return super().__new__(cls)
+
+    def __init__(self, backend='list'):
+        self.backend = backend
         # Board setup
         self.board = [
             ['bR','bN','bB','bQ','bK','bB','bN','bR'],
@@ -29,55 +122,259 @@ class GameState():
         self.pins = []
         self.checks = []
         self.enpassantPossible = ()
-        self.moves_log = []  # This will store move strings in algebraic notation
         self.fullmove_number = 1  # Starts at 1, increments after black moves
+        self.halfmove_clock = 0  # Plies since the last capture or pawn move, for the 50-move rule
         
         # Castling rights
         self.white_castle_kingside = True
         self.white_castle_queenside = True
         self.black_castle_kingside = True
         self.black_castle_queenside = True
-        self.castle_log = []
+
+        # 64-bit position key, updated incrementally by makeMove/undoMove
+        self.zobrist_key = self.computeZobristKey()
+        self.placement_cache = (None, '')  # (zobrist_key, FEN piece placement) of the last to_fen
+
+        # Per-side attack counts, brought up to date by syncAttackMaps when a query needs them
+        self.buildAttackMaps()
+
+        # One tuple per ply with what undoMove cannot work out from the move itself:
+        # (captured piece, castling bits, en passant square, halfmove clock, zobrist key)
+        self.state_log = []
+
+    def syncFromBoard(self):
+        # Recompute state derived from self.board after it was set directly
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] == 'wK':
+                    self.white_king_loc = (r, c)
+                elif self.board[r][c] == 'bK':
+                    self.black_king_loc = (r, c)
+        self.zobrist_key = self.computeZobristKey()
+        self.placement_cache = (None, '')
+        self.buildAttackMaps()
+
+    @property
+    def moves_log(self):
+        # Numbered move pairs in algebraic notation ("1. e4 e5"), built from move_log when asked for
+        white_first = self.white_to_move == (len(self.move_log) % 2 == 0)
+        black_moves = len(self.move_log) // 2 if white_first else (len(self.move_log) + 1) // 2
+        number = self.fullmove_number - black_moves
+        moves_log = []
+        for i, move in enumerate(self.move_log):
+            notation = move.getChessNotation()
+            if (i % 2 == 0) == white_first:
+                moves_log.append(f"{number}. {notation}")
+            else:
+                if i == 0:
+                    moves_log.append(f"{number}... {notation}")
+                else:
+                    moves_log[-1] += f" {notation}"
+                number += 1
+        return moves_log
+
+    @classmethod
+    def from_fen(cls, fen, backend='list'):
+        # Build a position from a FEN; the halfmove clock and fullmove number default to 0 and 1
+        fields = fen.split()
+        if len(fields) < 4 or len(fields) > 6:
+            raise ValueError(f"FEN needs four to six fields: {fen!r}")
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError(f"FEN placement needs eight ranks: {fen!r}")
+        gs = cls(backend)
+        board = []
+        for rank in rows:
+            row = []
+            for ch in rank:
+                if ch.isdigit():
+                    row.extend(['--'] * int(ch))
+                elif ch in FEN_PIECES:
+                    row.append(FEN_PIECES[ch])
+                else:
+                    raise ValueError(f"Bad FEN piece {ch!r}: {fen!r}")
+            if len(row) != 8:
+                raise ValueError(f"FEN rank {rank!r} does not have eight squares")
+            board.append(row)
+        # Move generation assumes one king per side and no pawns on the back ranks
+        pieces = [piece for row in board for piece in row]
+        if pieces.count('wK') != 1 or pieces.count('bK') != 1:
+            raise ValueError(f"FEN needs exactly one king per side: {fen!r}")
+        if 'wp' in board[0] + board[7] or 'bp' in board[0] + board[7]:
+            raise ValueError(f"FEN has a pawn on the first or eighth rank: {fen!r}")
+        gs.board = board
+        if fields[1] not in ('w', 'b'):
+            raise ValueError(f"Bad FEN side to move: {fen!r}")
+        gs.white_to_move = fields[1] == 'w'
+        gs.white_castle_kingside = 'K' in fields[2]
+        gs.white_castle_queenside = 'Q' in fields[2]
+        gs.black_castle_kingside = 'k' in fields[2]
+        gs.black_castle_queenside = 'q' in fields[2]
+        if fields[3] == '-':
+            gs.enpassantPossible = ()
+        else:
+            gs.enpassantPossible = (Move.ranks_to_rows[fields[3][1]], Move.files_to_cols[fields[3][0]])
+        try:
+            gs.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+            gs.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError(f"Bad FEN move counters: {fen!r}") from None
+        if gs.halfmove_clock < 0 or gs.fullmove_number < 1:
+            raise ValueError(f"Bad FEN move counters: {fen!r}")
+        gs.syncFromBoard()
+        return gs
+
+    def to_fen(self):
+        # All six FEN fields; the placement string is reused while the position is unchanged
+        cached_key, placement = self.placement_cache
+        if cached_key != self.zobrist_key:
+            ranks = []
+            for row in self.board:
+                rank = ''
+                empty = 0
+                for piece in row:
+                    if piece == '--':
+                        empty += 1
+                        continue
+                    if empty:
+                        rank += str(empty)
+                        empty = 0
+                    rank += FEN_SYMBOLS[piece]
+                if empty:
+                    rank += str(empty)
+                ranks.append(rank)
+            placement = '/'.join(ranks)
+            self.placement_cache = (self.zobrist_key, placement)
+        castling = ''.join(flag for flag, allowed in (('K', self.white_castle_kingside),
+                                                      ('Q', self.white_castle_queenside),
+                                                      ('k', self.black_castle_kingside),
+                                                      ('q', self.black_castle_queenside)) if allowed) or '-'
+        if self.enpassantPossible:
+            row, col = self.enpassantPossible
+            enpassant = Move.cols_to_files[col] + Move.rows_to_ranks[row]
+        else:
+            enpassant = '-'
+        return (f"{placement} {'w' if self.white_to_move else 'b'} {castling} {enpassant} "
+                f"{self.halfmove_clock} {self.fullmove_number}")
+
+    def snapshot(self):
+        # Current position only; move history and logs are not included
+        board = bytes(SNAPSHOT_BYTES[piece] for row in self.board for piece in row)
+        enpassant = self.enpassantPossible[0] * 8 + self.enpassantPossible[1] if self.enpassantPossible else -1
+        return PositionSnapshot(board, self.white_to_move, self.castleRightsIndex(), enpassant,
+                                self.white_king_loc[0] * 8 + self.white_king_loc[1],
+                                self.black_king_loc[0] * 8 + self.black_king_loc[1],
+                                self.halfmove_clock, self.fullmove_number, self.zobrist_key)
+
+    def restore(self, snapshot):
+        # Replace the position with a snapshot; move history starts empty from here
+        board = snapshot.board
+        self.board = [[SNAPSHOT_PIECES[byte] for byte in board[r:r + 8]] for r in range(0, 64, 8)]
+        self.white_to_move = snapshot.white_to_move
+        self.setCastleRights(snapshot.castling)
+        self.enpassantPossible = divmod(snapshot.enpassant, 8) if snapshot.enpassant >= 0 else ()
+        self.white_king_loc = divmod(snapshot.white_king, 8)
+        self.black_king_loc = divmod(snapshot.black_king, 8)
+        self.halfmove_clock = snapshot.halfmove_clock
+        self.fullmove_number = snapshot.fullmove_number
+        self.zobrist_key = snapshot.zobrist_key
+        self.placement_cache = (None, '')
+        self.checkmate = self.stalemate = self.in_check = False
+        self.pins, self.checks = [], []
+        self.move_log, self.state_log = [], []
+        self.buildAttackMaps()
+
+    @classmethod
+    def from_snapshot(cls, snapshot, backend='list'):
+        gs = cls(backend)
+        gs.restore(snapshot)
+        return gs
+
+    def clone(self):
+        # Independent copy of the current position (without move history) on the same backend
+        return GameState.from_snapshot(self.snapshot(), self.backend)
+
+    def castleRightsIndex(self):
+        # Castling flags packed as bits K=1, Q=2, k=4, q=8
+        return (self.white_castle_kingside | self.white_castle_queenside << 1 |
+                self.black_castle_kingside << 2 | self.black_castle_queenside << 3)
+
+    def setCastleRights(self, castling):
+        self.white_castle_kingside = bool(castling & 1)
+        self.white_castle_queenside = bool(castling & 2)
+        self.black_castle_kingside = bool(castling & 4)
+        self.black_castle_queenside = bool(castling & 8)
+
+    def positionHistory(self):
+        # Zobrist keys of the positions before each move in move_log, oldest first
+        return [state[4] for state in self.state_log]
+
+    def computeZobristKey(self):
+        # Full O(64) key; makeMove/undoMove keep self.zobrist_key equal to this
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != '--':
+                    key ^= ZOBRIST_PIECES[piece][r * 8 + c]
+        if not self.white_to_move:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.castleRightsIndex()]
+        if self.enpassantPossible:
+            key ^= ZOBRIST_ENPASSANT_FILE[self.enpassantPossible[1]]
+        return key
 
     def makeMove(self, move):
+        pieces = move.pieces
+        piece_moved = MOVE_PIECES[pieces & 15]
+        piece_captured = MOVE_PIECES[pieces >> 4]
         # Clear the square where the piece was
         self.board[move.start_row][move.start_col] = '--'
         
         # Handle pawn promotion
         if move.isPawnPromotion:
-            promoted_piece = move.piece_moved[0] + move.promotion_choice
+            promoted_piece = piece_moved[0] + move.promotion_choice
             self.board[move.end_row][move.end_col] = promoted_piece
         # Handle en passant capture
         elif move.isEnpassantMove:
-            self.board[move.end_row][move.end_col] = move.piece_moved
+            self.board[move.end_row][move.end_col] = piece_moved
             self.board[move.start_row][move.end_col] = '--'  # Remove the captured pawn
         # Normal move
         else:
-            self.board[move.end_row][move.end_col] = move.piece_moved
+            self.board[move.end_row][move.end_col] = piece_moved
         
-        # Update move log
+        # Update move log and remember the state this move overwrites
         self.move_log.append(move)
+        castling = self.castleRightsIndex()
+        state = (piece_captured, castling, self.enpassantPossible, self.halfmove_clock, self.zobrist_key)
+        if piece_moved[1] == 'p' or piece_captured != '--':
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        
+        # Hash out the old en passant file and castling rights, hash in the moved pieces
+        key = self.zobrist_key ^ ZOBRIST_BLACK_TO_MOVE ^ ZOBRIST_CASTLING[castling]
+        if self.enpassantPossible:
+            key ^= ZOBRIST_ENPASSANT_FILE[self.enpassantPossible[1]]
+        key ^= ZOBRIST_PIECES[piece_moved][move.start_row * 8 + move.start_col]
+        key ^= ZOBRIST_PIECES[self.board[move.end_row][move.end_col]][move.end_row * 8 + move.end_col]
+        if move.isEnpassantMove:
+            key ^= ZOBRIST_PIECES[piece_captured][move.start_row * 8 + move.end_col]
+        elif piece_captured != '--':
+            key ^= ZOBRIST_PIECES[piece_captured][move.end_row * 8 + move.end_col]
         
         # Update en passant opportunity
-        if move.piece_moved[1] == 'p' and abs(move.start_row - move.end_row) == 2:
+        if piece_moved[1] == 'p' and abs(move.start_row - move.end_row) == 2:
             self.enpassantPossible = ((move.start_row + move.end_row) // 2, move.end_col)
         else:
             self.enpassantPossible = ()
         
         # Update king position if king moved
-        if move.piece_moved == 'wK':
+        if piece_moved == 'wK':
             self.white_king_loc = (move.end_row, move.end_col)
-        elif move.piece_moved == 'bK':
+        elif piece_moved == 'bK':
             self.black_king_loc = (move.end_row, move.end_col)
         
-        # Store current castling rights before updating them
-        self.castle_log.append((
-            self.white_castle_kingside, 
-            self.white_castle_queenside,
-            self.black_castle_kingside, 
-            self.black_castle_queenside
-        ))
-        
         # Update castling rights
         self.updateCastleRights(move)
         
@@ -92,23 +389,21 @@ class GameState():
                 # Move rook
                 self.board[move.end_row][move.end_col+1] = self.board[move.end_row][0]
                 self.board[move.end_row][0] = '--'
+            rook = piece_moved[0] + 'R'
+            rook_from = move.end_row * 8 + (7 if move.end_col > move.start_col else 0)
+            rook_to = move.end_row * 8 + (move.end_col - 1 if move.end_col > move.start_col else move.end_col + 1)
+            key ^= ZOBRIST_PIECES[rook][rook_from] ^ ZOBRIST_PIECES[rook][rook_to]
         
-        # Update moves log
-        move_notation = move.getChessNotation()
+        key ^= ZOBRIST_CASTLING[self.castleRightsIndex()]
+        if self.enpassantPossible:
+            key ^= ZOBRIST_ENPASSANT_FILE[self.enpassantPossible[1]]
+        self.zobrist_key = key
+        self.state_log.append(state)
+        self.invalidateAttacks(move)
         
-        if self.white_to_move:
-            # White's move - create new move pair
-            self.moves_log.append(f"{self.fullmove_number}. {move_notation}")
-        else:
-            # Black's move - append to last move or create new if needed
-            if len(self.moves_log) > 0 and len(self.moves_log[-1].split()) < 3:
-                # Append black's move to existing white's move
-                self.moves_log[-1] += f" {move_notation}"
-                self.fullmove_number += 1
-            else:
-                # Shouldn't normally happen, but just in case
-                self.moves_log.append(f"{self.fullmove_number}... {move_notation}")
-                self.fullmove_number += 1
+        # Move numbers advance after black's move; SAN for moves_log is built on demand
+        if not self.white_to_move:
+            self.fullmove_number += 1
 
         # Switch turns
         self.white_to_move = not self.white_to_move
@@ -119,86 +414,79 @@ class GameState():
             return  # No moves to undo
         
         move = self.move_log.pop()
+        captured, castling, self.enpassantPossible, self.halfmove_clock, self.zobrist_key = self.state_log.pop()
+        piece_moved = MOVE_PIECES[move.pieces & 15]
         
         # Put the moved piece back
-        self.board[move.start_row][move.start_col] = move.piece_moved
+        self.board[move.start_row][move.start_col] = piece_moved
         
         # Handle en passant undo
         if move.isEnpassantMove:
             self.board[move.end_row][move.end_col] = '--'  # Remove moved pawn
-            self.board[move.start_row][move.end_col] = move.piece_captured  # Put back captured pawn
+            self.board[move.start_row][move.end_col] = captured  # Put back captured pawn
         # Handle normal capture undo
         else:
-            self.board[move.end_row][move.end_col] = move.piece_captured
+            self.board[move.end_row][move.end_col] = captured
         
         # Update king position if moved
-        if move.piece_moved == 'wK':
+        if piece_moved == 'wK':
             self.white_king_loc = (move.start_row, move.start_col)
-        elif move.piece_moved == 'bK':
+        elif piece_moved == 'bK':
             self.black_king_loc = (move.start_row, move.start_col)
         
-        # Restore en passant possibility
-        self.enpassantPossible = move.enpassantPossible if hasattr(move, 'enpassantPossible') else ()
-        
         # Restore castling rights
-        if len(self.castle_log) > 0:
-            castle_rights = self.castle_log.pop()
-            self.white_castle_kingside = castle_rights[0]
-            self.white_castle_queenside = castle_rights[1]
-            self.black_castle_kingside = castle_rights[2]
-            self.black_castle_queenside = castle_rights[3]
-            
-            # Restore rook position if castling was undone
-            if move.isCastleMove:
-                if move.end_col - move.start_col == 2:  # Kingside
-                    # Move rook back from f to h
-                    self.board[move.end_row][7] = self.board[move.end_row][5]
-                    self.board[move.end_row][5] = '--'
-                else:  # Queenside
-                    # Move rook back from d to a
-                    self.board[move.end_row][0] = self.board[move.end_row][3]
-                    self.board[move.end_row][3] = '--'
-        
-        # Update moves log
-                if len(self.moves_log) > 0:
-                    if not self.white_to_move:
-                        # If undoing black's move, we need to remove both moves
-                        if len(self.moves_log[-1].split()) == 3:  # Contains both white and black moves
-                            self.fullmove_number -= 1
-                            self.moves_log.pop()
-                        else:
-                            # Just remove black's move
-                            parts = self.moves_log[-1].split()
-                            self.moves_log[-1] = parts[0]  # Keep just the move number and white's move
-                    else:
-                        # Undoing white's move - remove the last entry
-                        if len(self.moves_log[-1].split()) == 3:  # Contains both moves
-                            parts = self.moves_log[-1].split()
-                            self.moves_log[-1] = f"{parts[0]} {parts[1]}"  # Keep just white's move
-                        else:
-                            self.moves_log.pop()
+        self.setCastleRights(castling)
+        
+        # Restore rook position if castling was undone
+        if move.isCastleMove:
+            if move.end_col - move.start_col == 2:  # Kingside
+                # Move rook back from f to h
+                self.board[move.end_row][7] = self.board[move.end_row][5]
+                self.board[move.end_row][5] = '--'
+            else:  # Queenside
+                # Move rook back from d to a
+                self.board[move.end_row][0] = self.board[move.end_row][3]
+                self.board[move.end_row][3] = '--'
+        self.invalidateAttacks(move)
+
+        if self.white_to_move:  # Undoing black's move
+            self.fullmove_number -= 1
 
         # Switch turns back
         self.white_to_move = not self.white_to_move
         
 
+    def changedSquares(self, move):
+        # Squares whose contents differ before and after move
+        changed = [move.start_row * 8 + move.start_col, move.end_row * 8 + move.end_col]
+        if move.isEnpassantMove:
+            changed.append(move.start_row * 8 + move.end_col)
+        elif move.isCastleMove:
+            if move.end_col > move.start_col:
+                changed += [move.end_row * 8 + 7, move.end_row * 8 + 5]
+            else:
+                changed += [move.end_row * 8, move.end_row * 8 + 3]
+        return changed
+
     def updateCastleRights(self, move):
+        piece_moved = MOVE_PIECES[move.pieces & 15]
+        piece_captured = MOVE_PIECES[move.pieces >> 4]
         # King moves - revoke all castling rights for that color
-        if move.piece_moved == 'wK':
+        if piece_moved == 'wK':
             self.white_castle_kingside = False
             self.white_castle_queenside = False
-        elif move.piece_moved == 'bK':
+        elif piece_moved == 'bK':
             self.black_castle_kingside = False
             self.black_castle_queenside = False
         
         # Rook moves - revoke specific castling right
-        elif move.piece_moved == 'wR':
+        elif piece_moved == 'wR':
             if move.start_row == 7:  # Only check if it's a rook in the back rank
                 if move.start_col == 0:  # Queenside rook (a1)
                     self.white_castle_queenside = False
                 elif move.start_col == 7:  # Kingside rook (h1)
                     self.white_castle_kingside = False
-        elif move.piece_moved == 'bR':
+        elif piece_moved == 'bR':
             if move.start_row == 0:  # Only check if it's a rook in the back rank
                 if move.start_col == 0:  # Queenside rook (a8)
                     self.black_castle_queenside = False
@@ -206,13 +494,13 @@ class GameState():
                     self.black_castle_kingside = False
         
         # Rook captures - revoke specific castling right
-        if move.piece_captured == 'wR':
+        if piece_captured == 'wR':
             if move.end_row == 7:  # Only check if it's a rook in the back rank
                 if move.end_col == 0:  # Queenside rook
                     self.white_castle_queenside = False
                 elif move.end_col == 7:  # Kingside rook
                     self.white_castle_kingside = False
-        elif move.piece_captured == 'bR':
+        elif piece_captured == 'bR':
             if move.end_row == 0:  # Only check if it's a rook in the back rank
                 if move.end_col == 0:  # Queenside rook
                     self.black_castle_queenside = False
@@ -220,93 +508,7 @@ class GameState():
                     self.black_castle_kingside = False
 
     def getValidMoves(self):
-        tempEnpassantPossible = self.enpassantPossible
-        moves = []
-        self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
-    
-        if self.white_to_move:
-            king_row, king_col = self.white_king_loc
-        else:
-            king_row, king_col = self.black_king_loc
-        
-        if self.in_check:
-            if len(self.checks) == 1:  # Only 1 check, block or move king
-                moves = self.getAllPossibleMoves()
-                # Must block check or capture checking piece
-                check = self.checks[0]
-                
-                # Get check information
-                if len(check) >= 3:  # For normal pieces (row, col, direction)
-                    check_row, check_col = check[0], check[1]
-                    if len(check) >= 4:  # Direction provided
-                        direction = (check[2], check[3])
-                    else:
-                        direction = None
-                else:
-                    check_row, check_col = check[0], check[1]
-                    direction = None
-                
-                checking_piece = self.board[check_row][check_col]
-                
-                valid_squares = []
-                if checking_piece[1] == 'N':  # Knight must be captured
-                    valid_squares = [(check_row, check_col)]
-                else:
-                    if direction:  # Only proceed if we have a direction
-                        for i in range(1, 8):
-                            valid_square = (king_row + direction[0] * i, 
-                                      king_col + direction[1] * i)
-                            valid_squares.append(valid_square)
-                            if valid_square[0] == check_row and valid_square[1] == check_col:
-                                break
-                
-                # Remove moves that don't block check or move king
-                for i in range(len(moves)-1, -1, -1):
-                    if i < len(moves):  # Check if index is still valid
-                        move = moves[i]
-                        if move.piece_moved[1] != 'K':  # Not king move
-                            if not (move.end_row, move.end_col) in valid_squares:
-                                moves.remove(move)
-                
-                # Get king moves
-                king_moves = []
-                self.getKingMoves(king_row, king_col, king_moves)
-                
-                # Filter king moves to those that don't result in check
-                for move in king_moves:
-                    self.makeMove(move)
-                    self.white_to_move = not self.white_to_move  # Switch turn back
-                    in_check, _, _ = self.checkForPinsAndChecks()
-                    if not in_check:
-                        moves.append(move)
-                    self.white_to_move = not self.white_to_move
-                    self.undoMove()
-            else:  # Double check, king must move
-                self.getKingMoves(king_row, king_col, moves)
-                # Filter to valid king moves
-                valid_king_moves = []
-                for i in range(len(moves)-1, -1, -1):
-                    if i < len(moves):  # Check index validity
-                        move = moves[i]
-                        self.makeMove(move)
-                        self.white_to_move = not self.white_to_move
-                        in_check, _, _ = self.checkForPinsAndChecks()
-                        if not in_check:
-                            valid_king_moves.append(move)
-                        self.white_to_move = not self.white_to_move
-                        self.undoMove()
-                moves = valid_king_moves
-        else:
-            # Get all possible moves when not in check
-            moves = self.getAllPossibleMoves()
-            
-            for i in range(len(moves)-1, -1, -1):
-                if i < len(moves):  # Check index validity
-                    self.makeMove(moves[i])
-                    in_check, _, _ = self.checkForPinsAndChecks()
-                    if in_check:
-                        moves.remove(moves[i])
-                    self.undoMove()
+        moves = self.legalMoves(self.getAllPossibleMoves)
         
         # Check for checkmate or stalemate
         if len(moves) == 0:
@@ -318,138 +520,505 @@ class GameState():
             self.checkmate = False
             self.stalemate = False
         
-        self.enpassantPossible = tempEnpassantPossible
         return moves
 
-    def getKingMoves(self, r, c, moves):
-        row_moves = [-1, -1, -1, 0, 0, 1, 1, 1]
-        col_moves = [-1, 0, 1, -1, 1, -1, 0, 1]
-        ally_color = 'w' if self.white_to_move else 'b'
-        
-        # Regular king moves
-        for i in range(8):
-            end_row = r + row_moves[i]
-            end_col = c + col_moves[i]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:  # Not an ally piece
-                    # Place king on new square temporarily
-                    self.board[r][c] = '--'
-                    if ally_color == 'w':
-                        self.white_king_loc = (end_row, end_col)
-                    else:
-                        self.black_king_loc = (end_row, end_col)
-                    
-                    # Store the captured piece
-                    captured_piece = self.board[end_row][end_col]
-                    self.board[end_row][end_col] = ally_color + 'K'
-                    
-                    # Check if the move would result in check
-                    in_check = self.inCheck(ally_color)
-                    
-                    # Restore the board
-                    self.board[r][c] = ally_color + 'K'
-                    self.board[end_row][end_col] = captured_piece
-                    if ally_color == 'w':
-                        self.white_king_loc = (r, c)
-                    else:
-                        self.black_king_loc = (r, c)
-                    
-                    # If the move doesn't result in check, add it
-                    if not in_check:
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
+    def legalMoves(self, generate):
+        # Pins and checks are computed once; the piece generators already respect pins,
+        # so only king moves and en passant need an explicit attack test.
+        self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
+    
+        if self.white_to_move:
+            king_row, king_col = self.white_king_loc
+        else:
+            king_row, king_col = self.black_king_loc
         
-        # Castling moves
-        self.getCastleMoves(r, c, moves, ally_color)
+        if self.in_check and len(self.checks) > 1:
+            # Double check, king must move (getKingMoves only returns safe squares)
+            moves = []
+            self.getKingMoves(king_row, king_col, moves)
+        else:
+            moves = generate()
+            if self.in_check:
+                # Only 1 check: capture the checking piece, block the ray or move the king
+                check_row, check_col = self.checks[0][:2]
+                check_sq = check_row * 8 + check_col
+                # BETWEEN is empty for knight and adjacent checkers, leaving only the capture
+                valid_squares = set(BETWEEN[king_row * 8 + king_col][check_sq])
+                valid_squares.add(check_sq)
+                moves = [move for move in moves
+                         if move.piece_moved[1] == 'K' or move.isEnpassantMove or
+                         move.end_row * 8 + move.end_col in valid_squares]
+            
+            # En passant removes two pawns from one rank, which pins cannot describe
+            moves = [move for move in moves
+                     if not move.isEnpassantMove or
+                     self.isEnpassantLegal(move.start_row, move.start_col, move.end_row, move.end_col, king_row, king_col)]
+        return moves
 
-    def getCastleMoves(self, r, c, moves, ally_color):
-        if self.in_check:
-            return  # Can't castle while in check
-        
-        if (self.white_to_move and self.white_castle_kingside) or (not self.white_to_move and self.black_castle_kingside):
-            self.getKingsideCastleMoves(r, c, moves)
-        if (self.white_to_move and self.white_castle_queenside) or (not self.white_to_move and self.black_castle_queenside):
-            self.getQueensideCastleMoves(r, c, moves)
+    def getNoisyMoves(self):
+        # Legal captures (en passant included) and promotions
+        return [move for move in self.legalMoves(self.getPossibleNoisyMoves)
+                if move.isCapture or move.isPawnPromotion]
 
-    def getKingsideCastleMoves(self, r, c, moves):
-        if (self.board[r][c+1] == '--' and 
-            self.board[r][c+2] == '--' and
-            not self.squareUnderAttack(r, c) and
-            not self.squareUnderAttack(r, c+1) and
-            not self.squareUnderAttack(r, c+2)):
-            moves.append(Move((r, c), (r, c+2), self.board, isCastleMove=True))
+    def getQuietMoves(self):
+        # Legal moves that neither capture nor promote; the filter is for double check,
+        # where legalMoves generates every king move itself
+        return [move for move in self.legalMoves(self.getPossibleQuietMoves)
+                if not move.isCapture and not move.isPawnPromotion]
 
-    def getQueensideCastleMoves(self, r, c, moves):
-        if (self.board[r][c-1] == '--' and 
-            self.board[r][c-2] == '--' and 
-            self.board[r][c-3] == '--' and
-            not self.squareUnderAttack(r, c) and
-            not self.squareUnderAttack(r, c-1) and
-            not self.squareUnderAttack(r, c-2)):
-            moves.append(Move((r, c), (r, c-2), self.board, isCastleMove=True))
+    def getPieceMoves(self, r, c):
+        # Legal moves of the piece on (r, c) only, e.g. to check a hash move without generating the rest
+        piece = self.board[r][c]
+        if piece == '--' or (piece[0] == 'w') != self.white_to_move:
+            return []
+        def generate():
+            moves = []
+            self.move_functions[piece[1]](r, c, moves)
+            return moves
+        return [move for move in self.legalMoves(generate) if move.start_row == r and move.start_col == c]
 
-    def inCheck(self, color):
-        if color == 'w':
+    def getPossibleNoisyMoves(self):
+        # Only pieces whose attack set reaches an enemy piece or the en passant square,
+        # and pawns one step from promotion, have their moves generated
+        ally = 'w' if self.white_to_move else 'b'
+        enemy = 'b' if self.white_to_move else 'w'
+        board = self.board
+        promotion_row = 1 if self.white_to_move else 6
+        ep_sq = self.enpassantPossible[0] * 8 + self.enpassantPossible[1] if self.enpassantPossible else -1
+        self.syncAttackMaps()
+        moves = []
+        for sq, attacks in enumerate(self.attack_sets):
+            if not attacks or attacks[0] != ally:
+                continue
+            r, c = sq >> 3, sq & 7
+            piece_type = board[r][c][1]
+            if not (piece_type == 'p' and r == promotion_row) and \
+               not any(board[target >> 3][target & 7][0] == enemy or target == ep_sq for target in attacks[1]):
+                continue
+            self.move_functions[piece_type](r, c, moves)
+        return moves
+
+    def getPossibleQuietMoves(self):
+        # Moves to empty squares that do not promote, respecting pins like the piece generators
+        ally = 'w' if self.white_to_move else 'b'
+        board = self.board
+        if self.white_to_move:
+            step, start_row, home_row = -1, 6, 7
+        else:
+            step, start_row, home_row = 1, 1, 0
+        self.syncAttackMaps()
+        moves = []
+        for sq, attacks in enumerate(self.attack_sets):
+            if not attacks or attacks[0] != ally:
+                continue
+            r, c = SQUARE_COORDS[sq]
+            piece_type = board[r][c][1]
+            if piece_type == 'K':
+                for end_sq in self.kingTargets(r, c):
+                    if board[end_sq >> 3][end_sq & 7] == '--':
+                        moves.append(Move((r, c), SQUARE_COORDS[end_sq], board))
+                if c == 4 and r == home_row:
+                    self.getCastleMoves(r, c, moves, ally)
+                continue
+            pin_line = self.pinLine(r, c)
+            if piece_type == 'p':
+                end_row = r + step
+                if end_row == 0 or end_row == 7 or board[end_row][c] != '--':
+                    continue  # Promotions are noisy
+                if pin_line is None or end_row * 8 + c in pin_line:
+                    moves.append(Move((r, c), (end_row, c), board))
+                    if r == start_row and board[end_row + step][c] == '--':
+                        moves.append(Move((r, c), (end_row + step, c), board))
+            elif piece_type == 'N':
+                if pin_line is None:
+                    for target in KNIGHT_TARGETS[sq]:
+                        if board[target >> 3][target & 7] == '--':
+                            moves.append(Move((r, c), SQUARE_COORDS[target], board))
+            else:
+                for d in SLIDER_DIRECTIONS[piece_type]:
+                    ray = RAYS[d][sq]
+                    if not ray or (pin_line is not None and ray[0] not in pin_line):
+                        continue
+                    for target in ray:
+                        if board[target >> 3][target & 7] != '--':
+                            break
+                        moves.append(Move((r, c), SQUARE_COORDS[target], board))
+        return moves
+
+    def getStagedMoves(self, hash_move_id=None, quiet_key=None):
+        """Yield legal moves lazily: hash move, winning captures, promotions, quiet moves, losing captures.
+
+        A stage is generated only once the previous one is used up, so a caller that stops early
+        (an alpha-beta cutoff) skips the rest. Moves may be made and undone between yields.
+        quiet_key orders the quiet moves (highest first). Unlike getValidMoves this does not
+        update the checkmate/stalemate flags.
+        """
+        if hash_move_id is not None:
+            # Only the hash move's own piece is generated, so a cutoff on it skips every stage
+            start_sq = hash_move_id & 63
+            hash_move = next((move for move in self.getPieceMoves(start_sq >> 3, start_sq & 7)
+                              if move.move_id == hash_move_id), None)
+            if hash_move is not None:
+                yield hash_move
+
+        noisy = self.getNoisyMoves()
+        winning, promotions, losing = [], [], []
+        for move in noisy:
+            if move.move_id == hash_move_id:
+                continue
+            if not move.isCapture:
+                promotions.append(move)
+            elif (EXCHANGE_VALUES[move.piece_moved[1]] > EXCHANGE_VALUES[move.piece_captured[1]] and
+                  not move.isPawnPromotion and self.see(move) < 0):
+                losing.append(move)  # Taking with a more valuable piece that the exchange loses
+            else:
+                winning.append(move)
+        # Most valuable victim first, least valuable attacker breaks ties
+        capture_order = lambda move: (EXCHANGE_VALUES[move.piece_captured[1]], -EXCHANGE_VALUES[move.piece_moved[1]])
+        winning.sort(key=capture_order, reverse=True)
+        yield from winning
+        yield from promotions
+
+        quiet = self.getQuietMoves()
+        if quiet_key is not None:
+            quiet.sort(key=quiet_key, reverse=True)
+        for move in quiet:
+            if move.move_id != hash_move_id:
+                yield move
+
+        losing.sort(key=capture_order, reverse=True)
+        yield from losing
+
+    def isEnpassantLegal(self, start_row, start_col, end_row, end_col, king_row, king_col):
+        # Play the capture on the board only, test the king square, then restore
+        pawn = self.board[start_row][start_col]
+        captured_pawn = self.board[start_row][end_col]
+        self.board[start_row][start_col] = '--'
+        self.board[start_row][end_col] = '--'
+        self.board[end_row][end_col] = pawn
+        in_check = self.scanForAttack(king_row, king_col, 'b' if self.white_to_move else 'w')
+        self.board[start_row][start_col] = pawn
+        self.board[start_row][end_col] = captured_pawn
+        self.board[end_row][end_col] = '--'
+        return not in_check
+
+    def countLegalMoves(self):
+        # Same as len(self.getValidMoves()) but no Move objects are built
+        return self.countMoves()
+
+    def hasLegalMove(self):
+        # Stops at the first legal move found; False means checkmate or stalemate
+        return self.countMoves(first_only=True) > 0
+
+    def countMoves(self, first_only=False):
+        self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
+        board = self.board
+        if self.white_to_move:
+            ally, enemy = 'w', 'b'
             king_row, king_col = self.white_king_loc
+            step, start_row = -1, 6
         else:
+            ally, enemy = 'b', 'w'
             king_row, king_col = self.black_king_loc
+            step, start_row = 1, 1
+        king_sq = king_row * 8 + king_col
+
+        count = len(self.kingTargets(king_row, king_col))
+        if not self.in_check and king_col == 4 and king_row == (7 if self.white_to_move else 0):
+            count += self.canCastleKingside(king_row) + self.canCastleQueenside(king_row)
+        if (count and first_only) or len(self.checks) > 1:
+            return count
+
+        # In single check the other pieces must capture the checker or block (en passant is tested apart)
+        valid = None
+        if self.in_check:
+            check_sq = self.checks[0][0] * 8 + self.checks[0][1]
+            valid = set(BETWEEN[king_sq][check_sq])
+            valid.add(check_sq)
+        pin_lines = {pin[0] * 8 + pin[1]: LINE[king_sq][pin[0] * 8 + pin[1]] for pin in self.pins}
+        ep_sq = self.enpassantPossible[0] * 8 + self.enpassantPossible[1] if self.enpassantPossible else -1
+
+        for sq in range(64):
+            r, c = SQUARE_COORDS[sq]
+            piece = board[r][c]
+            if piece[0] != ally or piece[1] == 'K':
+                continue
+            piece_type = piece[1]
+            pin_line = pin_lines.get(sq)
+            if piece_type == 'N':
+                if pin_line is None:
+                    for target in KNIGHT_TARGETS[sq]:
+                        if board[target >> 3][target & 7][0] != ally and (valid is None or target in valid):
+                            count += 1
+            elif piece_type == 'p':
+                end_row = r + step
+                promotions = 4 if end_row == 0 or end_row == 7 else 1
+                push = end_row * 8 + c
+                if board[end_row][c] == '--' and (pin_line is None or push in pin_line):
+                    if valid is None or push in valid:
+                        count += promotions
+                    double = push + 8 * step
+                    if r == start_row and board[double >> 3][c] == '--' and (valid is None or double in valid):
+                        count += 1
+                for target in PAWN_TARGETS[ally][sq]:
+                    if pin_line is not None and target not in pin_line:
+                        continue
+                    if board[target >> 3][target & 7][0] == enemy:
+                        if valid is None or target in valid:
+                            count += promotions
+                    elif target == ep_sq and self.isEnpassantLegal(r, c, target >> 3, target & 7, king_row, king_col):
+                        count += 1
+            else:
+                for d in SLIDER_DIRECTIONS[piece_type]:
+                    ray = RAYS[d][sq]
+                    if not ray or (pin_line is not None and ray[0] not in pin_line):
+                        continue
+                    for target in ray:
+                        target_piece = board[target >> 3][target & 7]
+                        if target_piece == '--':
+                            if valid is None or target in valid:
+                                count += 1
+                        else:
+                            if target_piece[0] == enemy and (valid is None or target in valid):
+                                count += 1
+                            break
+            if count and first_only:
+                return count
+        return count
+
+    def getCastleMoves(self, r, c, moves, ally_color):
+        if self.in_check:
+            return  # Can't castle while in check
         
-        # Temporarily switch turns to get opponent's perspective
-        self.white_to_move = not (color == 'w')
-        opponent_moves = self.getAllPossibleMoves()
-        self.white_to_move = (color == 'w')  # Switch back
-        
-        for move in opponent_moves:
-            if move.end_row == king_row and move.end_col == king_col:
-                return True
-        return False
+        self.getKingsideCastleMoves(r, c, moves)
+        self.getQueensideCastleMoves(r, c, moves)
+
+    def inCheck(self, color):
+        king_loc = self.white_king_loc if color == 'w' else self.black_king_loc
+        return self.isAttacked(king_loc, 'b' if color == 'w' else 'w')
 
     def squareUnderAttack(self, r, c):
-        original_turn = self.white_to_move
-        self.white_to_move = not original_turn  # Switch to opponent's perspective
-        
-        # Check for attacking pawns
-        pawn_dir = 1 if self.white_to_move else -1
-        for dc in [-1, 1]:  # Check diagonal pawn attacks
-            if 0 <= r+pawn_dir < 8 and 0 <= c+dc < 8:
-                piece = self.board[r+pawn_dir][c+dc]
-                if piece == ('w' if self.white_to_move else 'b') + 'p':
-                    self.white_to_move = original_turn
-                    return True
+        # Attacked by the side not to move
+        return self.isAttacked((r, c), 'b' if self.white_to_move else 'w')
+
+    def isAttacked(self, square, by_color):
+        # O(1) lookup while the attack maps are current; otherwise the board is scanned rather
+        # than syncing the maps, so move generation never pays for them
+        if self.stale_attacks == []:
+            return self.attack_map[by_color][square[0] * 8 + square[1]] > 0
+        return self.scanForAttack(square[0], square[1], by_color)
+
+    def buildAttackMaps(self):
+        # attack_map[color][sq] counts color's pieces attacking sq; attack_sets[sq] lists what the piece on sq attacks
+        self.attack_map = {'w': [0] * 64, 'b': [0] * 64}
+        self.attack_sets = [()] * 64
+        for sq in range(64):
+            self.refreshAttacks(sq)
+        # Moves made or undone since the maps were last current; None when a full rebuild is due
+        self.stale_attacks = []
+
+    def invalidateAttacks(self, move):
+        # Called by makeMove/undoMove; the maps catch up in syncAttackMaps
+        stale = self.stale_attacks
+        if stale is not None:
+            if len(stale) < 16:
+                stale.append(move)
+            else:
+                self.stale_attacks = None
+
+    def syncAttackMaps(self):
+        # Bring attack_map and attack_sets up to date before reading them
+        stale = self.stale_attacks
+        if stale is None:
+            self.buildAttackMaps()
+        elif stale:
+            changed = set()
+            for move in stale:
+                changed.update(self.changedSquares(move))
+            self.updateAttackMaps(changed)
+            stale.clear()
+
+    def refreshAttacks(self, sq):
+        # Replace the attack set of whatever is on sq now
+        old = self.attack_sets[sq]
+        if old:
+            counts = self.attack_map[old[0]]
+            for target in old[1]:
+                counts[target] -= 1
+        piece = self.board[sq >> 3][sq & 7]
+        if piece == '--':
+            self.attack_sets[sq] = ()
+            return
+        targets = self.attackedFrom(sq, piece)
+        counts = self.attack_map[piece[0]]
+        for target in targets:
+            counts[target] += 1
+        self.attack_sets[sq] = (piece[0], targets)
+
+    def attackedFrom(self, sq, piece):
+        # Squares attacked by piece standing on sq
+        piece_type = piece[1]
+        if piece_type == 'p':
+            return PAWN_TARGETS[piece[0]][sq]
+        if piece_type == 'N':
+            return KNIGHT_TARGETS[sq]
+        if piece_type == 'K':
+            return KING_TARGETS[sq]
+        board = self.board
+        targets = []
+        for d in SLIDER_DIRECTIONS[piece_type]:
+            for target in RAYS[d][sq]:
+                targets.append(target)
+                if board[target >> 3][target & 7] != '--':
+                    break
+        return tuple(targets)
+
+    def updateAttackMaps(self, changed):
+        # Refresh the squares whose contents changed plus every slider whose ray reaches one of them.
+        # A slider whose attacks changed has a changed square on its ray in the current board, so
+        # the squares of several moves and undos can be refreshed together.
+        board = self.board
+        affected = set(changed)
+        for sq in changed:
+            for d in range(8):
+                line_piece = 'R' if d < 4 else 'B'
+                for target in RAYS[d][sq]:
+                    piece = board[target >> 3][target & 7]
+                    if piece != '--':
+                        if piece[1] == 'Q' or piece[1] == line_piece:
+                            affected.add(target)
+                        break
+        for sq in affected:
+            self.refreshAttacks(sq)
+
+    def scanForAttack(self, r, c, by_color):
+        # Walk out from (r, c) on the current board; used while the attack maps are stale or do not match the board
+        # Check for attacking pawns: they stand where a pawn of the other color on (r, c) would capture
+        pawn = by_color + 'p'
+        for target in PAWN_TARGETS['b' if by_color == 'w' else 'w'][r * 8 + c]:
+            if self.board[target >> 3][target & 7] == pawn:
+                return True
         
         # Check knight attacks
-        knight_moves = [(-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1)]
-        for dr, dc in knight_moves:
-            if 0 <= r+dr < 8 and 0 <= c+dc < 8:
-                piece = self.board[r+dr][c+dc]
-                if piece == ('w' if self.white_to_move else 'b') + 'N':
-                    self.white_to_move = original_turn
-                    return True
-        
-        # Check sliding pieces (queen, rook, bishop)
-        directions = [(-1,0),(0,-1),(1,0),(0,1),(-1,-1),(-1,1),(1,-1),(1,1)]
-        for dr, dc in directions:
-            for i in range(1, 8):
-                end_row, end_col = r + dr*i, c + dc*i
-                if not (0 <= end_row < 8 and 0 <= end_col < 8):
-                    break
-                piece = self.board[end_row][end_col]
+        for target in KNIGHT_TARGETS[r * 8 + c]:
+            if self.board[target >> 3][target & 7] == by_color + 'N':
+                return True
+        
+        # Check sliding pieces (queen, rook, bishop) and the king
+        for d in range(8):
+            for i, target in enumerate(RAYS[d][r * 8 + c]):
+                piece = self.board[target >> 3][target & 7]
                 if piece != '--':
-                    if piece[0] == ('w' if self.white_to_move else 'b'):
+                    if piece[0] == by_color:
                         piece_type = piece[1]
-                        if (dr in (-1,0,1)) and (dc in (-1,0,1)):  # Diagonal
-                            if piece_type in ['B', 'Q']:
-                                self.white_to_move = original_turn
-                                return True
-                        else:  # Orthogonal
-                            if piece_type in ['R', 'Q']:
-                                self.white_to_move = original_turn
-                                return True
+                        if (i == 0 and piece_type == 'K') or piece_type == 'Q' or \
+                           piece_type == ('R' if d < 4 else 'B'):
+                            return True
                     break
-        
-        self.white_to_move = original_turn
         return False
 
+    def see(self, move):
+        """Static exchange evaluation of move in centipawns for the side making it.
+
+        Both sides then keep recapturing on the target square with their least valuable
+        attacker (x-rays included) and may stop whenever that is better. Pins are ignored.
+        """
+        enemy = 'b' if move.piece_moved[0] == 'w' else 'w'
+        end_sq = move.end_row * 8 + move.end_col
+        removed = {move.start_row * 8 + move.start_col}
+        gain = EXCHANGE_VALUES[move.piece_captured[1]] if move.isCapture else 0
+        occupant = move.piece_moved[1]
+        if move.isEnpassantMove:
+            removed.add(move.start_row * 8 + move.end_col)
+        elif move.isPawnPromotion:
+            occupant = move.promotion_choice
+            gain += EXCHANGE_VALUES[occupant] - EXCHANGE_VALUES['p']
+        return gain - self.exchange(end_sq, EXCHANGE_VALUES[occupant], enemy, removed)
+
+    def exchange(self, sq, occupant_value, color, removed):
+        # Material color wins by starting captures on sq, or 0 if it is better not to; removed is updated
+        gains = []
+        while True:
+            attacker = self.leastValuableAttacker(sq, color, removed)
+            if attacker is None:
+                break
+            attacker_sq, attacker_value = attacker
+            other = 'b' if color == 'w' else 'w'
+            if attacker_value == EXCHANGE_VALUES['K'] and \
+               self.leastValuableAttacker(sq, other, removed | {attacker_sq}) is not None:
+                break  # The king may not capture into a defended square
+            gains.append(occupant_value)
+            occupant_value = attacker_value
+            removed.add(attacker_sq)
+            color = other
+        # Walk the sequence backwards; each side recaptures only if it does not lose by it
+        score = 0
+        for gain in reversed(gains):
+            score = max(0, gain - score)
+        return score
+
+    def leastValuableAttacker(self, sq, color, removed):
+        # (square, value) of color's cheapest piece attacking sq, treating removed squares as empty
+        board = self.board
+        pawn = color + 'p'
+        for source in PAWN_TARGETS['b' if color == 'w' else 'w'][sq]:
+            if source not in removed and board[source >> 3][source & 7] == pawn:
+                return source, EXCHANGE_VALUES['p']
+        knight = color + 'N'
+        for source in KNIGHT_TARGETS[sq]:
+            if source not in removed and board[source >> 3][source & 7] == knight:
+                return source, EXCHANGE_VALUES['N']
+        best = None
+        for d in range(8):
+            for source in RAYS[d][sq]:
+                if source in removed:
+                    continue  # Look through pieces already used in the exchange
+                piece = board[source >> 3][source & 7]
+                if piece != '--':
+                    if piece[0] == color and (piece[1] == 'Q' or piece[1] == ('R' if d < 4 else 'B')):
+                        value = EXCHANGE_VALUES[piece[1]]
+                        if best is None or (value, source) < (best[1], best[0]):
+                            best = (source, value)  # Lowest square breaks ties, as in the bitboard backend
+                    break
+        if best is None:
+            king = color + 'K'
+            for source in KING_TARGETS[sq]:
+                if source not in removed and board[source >> 3][source & 7] == king:
+                    return source, EXCHANGE_VALUES['K']
+        return best
+
+    def attackerSequence(self, sq, color):
+        # color's pieces attacking sq in the order they would capture, batteries included
+        removed = set()
+        sequence = []
+        attacker = self.leastValuableAttacker(sq, color, removed)
+        while attacker is not None:
+            sequence.append(SQUARE_COORDS[attacker[0]])
+            removed.add(attacker[0])
+            attacker = self.leastValuableAttacker(sq, color, removed)
+        return sequence
+
+    def threatMap(self, color):
+        """Attackers, defenders and threat for every non-king piece of color.
+
+        Returns {(row, col): (attackers, defenders, threat)} where attackers and defenders
+        are squares in capture order and threat is what the opponent wins by capturing there
+        (0 for a safe piece).
+        """
+        enemy = 'b' if color == 'w' else 'w'
+        board = self.board
+        threats = {}
+        for sq in range(64):
+            r, c = SQUARE_COORDS[sq]
+            piece = board[r][c]
+            if piece[0] != color or piece[1] == 'K':
+                continue
+            attackers = self.attackerSequence(sq, enemy)
+            defenders = self.attackerSequence(sq, color)
+            threat = self.exchange(sq, EXCHANGE_VALUES[piece[1]], enemy, set()) if attackers else 0
+            threats[(r, c)] = (attackers, defenders, threat)
+        return threats
+
     def getAllPossibleMoves(self):
         """Get all possible moves without considering checks"""
         moves = []
@@ -468,6 +1037,7 @@ class GameState():
         pins = []
         checks = []
         in_check = False
+        board = self.board
         
         if self.white_to_move:
             enemy_color = 'b'
@@ -477,278 +1047,172 @@ class GameState():
             enemy_color = 'w'
             ally_color = 'b'
             start_row, start_col = self.black_king_loc
+        king_sq = start_row * 8 + start_col
             
         # Check outward from king for pins and checks
-        directions = [(-1,0),(0,-1),(1,0),(0,1),(-1,-1),(-1,1),(1,-1),(1,1)]
-        for j in range(len(directions)):
-            d = directions[j]
+        for j in range(8):
+            dr, dc = DIRECTIONS[j]
             possible_pin = ()
-            for i in range(1,8):
-                end_row = start_row + d[0] * i
-                end_col = start_col + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] == ally_color and end_piece[1] != 'K':
-                        if possible_pin == ():  # First allied piece could be pinned
-                            possible_pin = (end_row, end_col, d[0], d[1])
-                        else:  # Second allied piece, no pin
-                            break
-                    elif end_piece[0] == enemy_color:
-                        type = end_piece[1]
-                        # Check if piece can attack king
-                        if (0 <= j <= 3 and type == 'R') or \
-                           (4 <= j <= 7 and type == 'B') or \
-                           (i == 1 and type == 'p' and ((enemy_color == 'w' and 6 <= j <= 7) or (enemy_color == 'b' and 4 <= j <= 5))) or \
-                           (type == 'Q') or (i == 1 and type == 'K'):
-                            if possible_pin == ():  # No blocking piece
-                                in_check = True
-                                checks.append((end_row, end_col, d[0], d[1]))
-                                break
-                            else:  # Piece blocking, so pin
-                                pins.append(possible_pin)
-                                break
-                        else:  # Enemy piece not applying check
-                            break
-                else:  # Off board
-                    break
+            for i, target in enumerate(RAYS[j][king_sq], 1):
+                end_row, end_col = SQUARE_COORDS[target]
+                end_piece = board[end_row][end_col]
+                if end_piece == '--':
+                    continue
+                if end_piece[0] == ally_color:
+                    if possible_pin == ():  # First allied piece could be pinned
+                        possible_pin = (end_row, end_col, dr, dc)
+                        continue
+                    break  # Second allied piece, no pin
+                type = end_piece[1]
+                # Check if piece can attack king
+                if (j <= 3 and type == 'R') or \
+                   (j >= 4 and type == 'B') or \
+                   (i == 1 and type == 'p' and ((enemy_color == 'w' and j >= 6) or (enemy_color == 'b' and 4 <= j <= 5))) or \
+                   (type == 'Q') or (i == 1 and type == 'K'):
+                    if possible_pin == ():  # No blocking piece
+                        in_check = True
+                        checks.append((end_row, end_col, dr, dc))
+                    else:  # Piece blocking, so pin
+                        pins.append(possible_pin)
+                break
         
         # Check for knight checks
-        knight_moves = [(-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1)]
-        for m in knight_moves:
-            end_row = start_row + m[0]
-            end_col = start_col + m[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] == enemy_color and end_piece[1] == 'N':
-                    in_check = True
-                    checks.append((end_row, end_col, m[0], m[1]))
+        knight = enemy_color + 'N'
+        for target in KNIGHT_TARGETS[king_sq]:
+            end_row, end_col = SQUARE_COORDS[target]
+            if board[end_row][end_col] == knight:
+                in_check = True
+                checks.append((end_row, end_col, end_row - start_row, end_col - start_col))
         
         return in_check, pins, checks
 
+    def pinLine(self, r, c):
+        # Squares a pinned piece on (r, c) may still reach (its line through the king), or None
+        for pin in self.pins:
+            if pin[0] == r and pin[1] == c:
+                king_row, king_col = self.white_king_loc if self.white_to_move else self.black_king_loc
+                return LINE[king_row * 8 + king_col][r * 8 + c]
+        return None
+
 
     def getPawnMoves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        pin_line = self.pinLine(r, c)
+        board = self.board
     
         if self.white_to_move:
             move_amount = -1
             start_row = 6
             enemy_color = 'b'
+            ally_color = 'w'
         else:
             move_amount = 1
             start_row = 1
             enemy_color = 'w'
+            ally_color = 'b'
+        end_row = r + move_amount
+        promotion = end_row == 0 or end_row == 7
     
         # Pawn pushes
-        if self.board[r+move_amount][c] == '--':
-            if not piece_pinned or pin_direction == (move_amount, 0):
+        if board[end_row][c] == '--':
+            if pin_line is None or end_row * 8 + c in pin_line:
                 # Check if this move would result in promotion
-                if (r+move_amount == 0 and self.white_to_move) or (r+move_amount == 7 and not self.white_to_move):
-                    moves.append(Move((r,c), (r+move_amount,c), self.board, promotion_choice='Q'))
+                if promotion:
+                    for choice in PROMOTION_CHOICES:
+                        moves.append(Move((r,c), (end_row,c), board, promotion_choice=choice))
                 else:
-                    moves.append(Move((r,c), (r+move_amount,c), self.board))
+                    moves.append(Move((r,c), (end_row,c), board))
                 # Double pawn push
-                if r == start_row and self.board[r+2*move_amount][c] == '--':
-                    moves.append(Move((r,c), (r+2*move_amount,c), self.board))
+                if r == start_row and board[r+2*move_amount][c] == '--':
+                    moves.append(Move((r,c), (r+2*move_amount,c), board))
     
         # Pawn captures
-        for d in [-1, 1]:  # Left and right capture
-            if 0 <= c+d < 8:
-                if not piece_pinned or pin_direction == (move_amount, d):
-                    # Normal capture
-                    if self.board[r+move_amount][c+d][0] == enemy_color:
-                        # Promotion capture
-                        if (r+move_amount == 0 and self.white_to_move) or (r+move_amount == 7 and not self.white_to_move):
-                            moves.append(Move((r,c), (r+move_amount,c+d), self.board, promotion_choice='Q'))
-                        else:
-                            moves.append(Move((r,c), (r+move_amount,c+d), self.board))
-                    # En passant
-                    elif (r+move_amount, c+d) == self.enpassantPossible:
-                        moves.append(Move((r,c), (r+move_amount,c+d), self.board, isEnpassantMove=True))
+        for target in PAWN_TARGETS[ally_color][r * 8 + c]:
+            if pin_line is not None and target not in pin_line:
+                continue
+            end = SQUARE_COORDS[target]
+            # Normal capture
+            if board[end[0]][end[1]][0] == enemy_color:
+                # Promotion capture
+                if promotion:
+                    for choice in PROMOTION_CHOICES:
+                        moves.append(Move((r,c), end, board, promotion_choice=choice))
+                else:
+                    moves.append(Move((r,c), end, board))
+            # En passant
+            elif end == self.enpassantPossible:
+                moves.append(Move((r,c), end, board, isEnpassantMove=True))
 
-    def getRookMoves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                # Queen can be pinned and still move along pin direction
-                if self.board[r][c][1] != 'Q':
-                    self.pins.remove(self.pins[i])
-                break
-        
-        directions = [(-1,0),(0,-1),(1,0),(0,1)]  # up, left, down, right
+    def getSliderMoves(self, r, c, moves, directions):
+        # Walk the precomputed rays; a pinned slider keeps only the rays along its pin line
+        pin_line = self.pinLine(r, c)
+        board = self.board
         enemy_color = 'b' if self.white_to_move else 'w'
-        
+        sq = r * 8 + c
         for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    # Check if moving along pin direction or not pinned
-                    if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == '--':  # Empty square
-                            moves.append(Move((r, c), (end_row, end_col), self.board))
-                        elif end_piece[0] == enemy_color:  # Capture
-                            moves.append(Move((r, c), (end_row, end_col), self.board))
-                            break
-                        else:  # Friendly piece
-                            break
-                    else:  # Moving against pin direction
-                        break
-                else:  # Off board
+            ray = RAYS[d][sq]
+            if not ray or (pin_line is not None and ray[0] not in pin_line):
+                continue
+            for target in ray:
+                end = SQUARE_COORDS[target]
+                end_piece = board[end[0]][end[1]]
+                if end_piece == '--':  # Empty square
+                    moves.append(Move((r, c), end, board))
+                else:
+                    if end_piece[0] == enemy_color:  # Capture
+                        moves.append(Move((r, c), end, board))
                     break
 
+    def getRookMoves(self, r, c, moves):
+        self.getSliderMoves(r, c, moves, SLIDER_DIRECTIONS['R'])
+
     def getBishopMoves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                # Queen can be pinned and still move along pin direction
-                if self.board[r][c][1] != 'Q':
-                    self.pins.remove(self.pins[i])
-                break
-        
-        directions = [(-1,-1),(-1,1),(1,-1),(1,1)]  # diagonals
-        enemy_color = 'b' if self.white_to_move else 'w'
-        
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    # Check if moving along pin direction or not pinned
-                    if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == '--':  # Empty square
-                            moves.append(Move((r, c), (end_row, end_col), self.board))
-                        elif end_piece[0] == enemy_color:  # Capture
-                            moves.append(Move((r, c), (end_row, end_col), self.board))
-                            break
-                        else:  # Friendly piece
-                            break
-                    else:  # Moving against pin direction
-                        break
-                else:  # Off board
-                    break
+        self.getSliderMoves(r, c, moves, SLIDER_DIRECTIONS['B'])
 
     def getKnightMoves(self, r, c, moves):
-        piece_pinned = False
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                self.pins.remove(self.pins[i])
-                break
-        
-        knight_moves = [(-2,-1),(-2,1),(-1,-2),(-1,2),(1,-2),(1,2),(2,-1),(2,1)]
+        if self.pinLine(r, c) is not None:
+            return  # Knight cannot move while pinned
+        board = self.board
         ally_color = 'w' if self.white_to_move else 'b'
-        
-        for m in knight_moves:
-            end_row = r + m[0]
-            end_col = c + m[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                if not piece_pinned:  # Knight cannot move while pinned
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] != ally_color:  # Empty or enemy square
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
+        for target in KNIGHT_TARGETS[r * 8 + c]:
+            end = SQUARE_COORDS[target]
+            if board[end[0]][end[1]][0] != ally_color:  # Empty or enemy square
+                moves.append(Move((r, c), end, board))
 
     def getQueenMoves(self, r, c, moves):
-        self.getRookMoves(r, c, moves)
-        self.getBishopMoves(r, c, moves)
+        self.getSliderMoves(r, c, moves, SLIDER_DIRECTIONS['Q'])
 
     def getKingMoves(self, r, c, moves):
-        row_moves = [-1, -1, -1, 0, 0, 1, 1, 1]
-        col_moves = [-1, 0, 1, -1, 1, -1, 0, 1]
-        ally_color = 'w' if self.white_to_move else 'b'
-        
-        for i in range(8):
-            end_row = r + row_moves[i]
-            end_col = c + col_moves[i]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:
-                    # Placeholder for king
-                    original_king_pos = self.board[r][c]
-                    original_target_pos = self.board[end_row][end_col]
-                    
-                    # Make the move
-                    self.board[r][c] = '--'
-                    self.board[end_row][end_col] = ally_color + 'K'
-                    
-                    # Update king position temporarily
-                    if ally_color == 'w':
-                        temp_king_loc = self.white_king_loc
-                        self.white_king_loc = (end_row, end_col)
-                    else:
-                        temp_king_loc = self.black_king_loc
-                        self.black_king_loc = (end_row, end_col)
-                    
-                    # Check for checks
-                    in_check, _, _ = self.checkForPinsAndChecks()
-                    
-                    # Undo the move
-                    self.board[r][c] = original_king_pos
-                    self.board[end_row][end_col] = original_target_pos
-                    if ally_color == 'w':
-                        self.white_king_loc = temp_king_loc
-                    else:
-                        self.black_king_loc = temp_king_loc
-                    
-                    if not in_check:
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
+        for end_sq in self.kingTargets(r, c):
+            moves.append(Move((r, c), SQUARE_COORDS[end_sq], self.board))
         
         # Castling moves
-        if not self.in_check:
-            if self.white_to_move:
-                if r == 7 and c == 4:  # White king
-                    # Kingside
-                    if (self.white_castle_kingside and 
-                        self.board[7][5] == '--' and 
-                        self.board[7][6] == '--' and
-                        not self.squareUnderAttack(7, 4) and  # Changed here
-                        not self.squareUnderAttack(7, 5) and  # Changed here
-                        not self.squareUnderAttack(7, 6)):    # Changed here
-                        moves.append(Move((7,4), (7,6), self.board, isCastleMove=True))
-                    # Queenside
-                    if (self.white_castle_queenside and 
-                        self.board[7][3] == '--' and 
-                        self.board[7][2] == '--' and 
-                        self.board[7][1] == '--' and
-                        not self.squareUnderAttack(7, 4) and  # Changed here
-                        not self.squareUnderAttack(7, 3) and  # Changed here
-                        not self.squareUnderAttack(7, 2)):    # Changed here
-                        moves.append(Move((7,4), (7,2), self.board, isCastleMove=True))
-            else:
-                if r == 0 and c == 4:  # Black king
-                    # Kingside
-                    if (self.black_castle_kingside and 
-                        self.board[0][5] == '--' and 
-                        self.board[0][6] == '--' and
-                        not self.squareUnderAttack(0, 4) and  # Changed here
-                        not self.squareUnderAttack(0, 5) and  # Changed here
-                        not self.squareUnderAttack(0, 6)):    # Changed here
-                        moves.append(Move((0,4), (0,6), self.board, isCastleMove=True))
-                    # Queenside
-                    if (self.black_castle_queenside and 
-                        self.board[0][3] == '--' and 
-                        self.board[0][2] == '--' and 
-                        self.board[0][1] == '--' and    
-                        not self.squareUnderAttack(0, 4) and  # Changed here
-                        not self.squareUnderAttack(0, 3) and  # Changed here
-                        not self.squareUnderAttack(0, 2)):     # Changed here
-                        moves.append(Move((0,4), (0,2), self.board, isCastleMove=True))   
+        if c == 4 and r == (7 if self.white_to_move else 0):
+            self.getCastleMoves(r, c, moves, 'w' if self.white_to_move else 'b')
+
+    def kingTargets(self, r, c):
+        # Squares the king on (r, c) can step to safely (castling not included)
+        ally_color = 'w' if self.white_to_move else 'b'
+        enemy_color = 'b' if self.white_to_move else 'w'
+        board = self.board
+        king = board[r][c]
+        
+        # Lift the king so a sliding checker still covers the square behind it
+        board[r][c] = '--'
+        targets = [end_sq for end_sq in KING_TARGETS[r * 8 + c]
+                   if board[end_sq >> 3][end_sq & 7][0] != ally_color and
+                   not self.scanForAttack(end_sq >> 3, end_sq & 7, enemy_color)]
+        board[r][c] = king
+        return targets
 
     def getKingsideCastleMoves(self, r, c, moves):
+        if self.canCastleKingside(r):
+            moves.append(Move((r, 4), (r, 6), self.board, isCastleMove=True))
+
+    def getQueensideCastleMoves(self, r, c, moves):
+        if self.canCastleQueenside(r):
+            moves.append(Move((r, 4), (r, 2), self.board, isCastleMove=True))
+
+    def canCastleKingside(self, r):
         if (self.board[r][5] == '--' and  # f-file
             self.board[r][6] == '--'):    # g-file
             if (not self.squareUnderAttack(r, 4) and  # e-file (king)
@@ -756,10 +1220,10 @@ class GameState():
             not self.squareUnderAttack(r, 6)):     # g-file
                 if (self.white_to_move and self.white_castle_kingside) or \
                 (not self.white_to_move and self.black_castle_kingside):
-                    if self.board[r][7][1] == 'R':  # h-file rook
-                        moves.append(Move((r, 4), (r, 6), self.board, isCastleMove=True))
+                    return self.board[r][7][1] == 'R'  # h-file rook
+        return False
 
-    def getQueensideCastleMoves(self, r, c, moves):
+    def canCastleQueenside(self, r):
         if (self.board[r][1] == '--' and  # b-file
             self.board[r][2] == '--' and   # c-file
             self.board[r][3] == '--'):     # d-file
@@ -768,8 +1232,8 @@ class GameState():
             not self.squareUnderAttack(r, 2)):     # c-file
                 if (self.white_to_move and self.white_castle_queenside) or \
                 (not self.white_to_move and self.black_castle_queenside):
-                    if self.board[r][0][1] == 'R':  # a-file rook
-                        moves.append(Move((r, 4), (r, 2), self.board, isCastleMove=True))
+                    return self.board[r][0][1] == 'R'  # a-file rook
+        return False
 
 
 
@@ -781,25 +1245,82 @@ class Move():
                      'e':4, 'f':5, 'g':6, 'h':7}
     cols_to_files = {v:k for k,v in files_to_cols.items()}
 
+    # flags values; promotions are FLAG_PROMOTION + index into PROMOTION_CHOICES
+    FLAG_CASTLE = 1
+    FLAG_ENPASSANT = 2
+    FLAG_PROMOTION = 4
+
+    # No per-instance __dict__: thousands of moves are built on every getValidMoves call.
+    # pieces is moved | captured << 4 in MOVE_PIECES codes; the piece strings are derived from it
+    __slots__ = ('start_row', 'start_col', 'end_row', 'end_col', 'pieces', 'flags')
+
     def __init__(self, start_sq, end_sq, board, isEnpassantMove=False,isCastleMove=False, promotion_choice='Q' ):
-        self.start_row = start_sq[0]
-        self.start_col = start_sq[1]
-        self.end_row = end_sq[0]
-        self.end_col = end_sq[1]
-        self.piece_moved = board[self.start_row][self.start_col]
-        self.piece_captured = board[self.end_row][self.end_col]
-        self.isCastleMove = isCastleMove
-        # Pawn promotion
-        self.isPawnPromotion = (self.piece_moved == 'wp' and self.end_row == 0) or \
-                              (self.piece_moved == 'bp' and self.end_row == 7)
-        self.promotion_choice = promotion_choice
-        
-        # En passant
-        self.isEnpassantMove = isEnpassantMove
-        if self.isEnpassantMove:
-            self.piece_captured = 'bp' if self.piece_moved == 'wp' else 'wp'
-            
-        self.move_id = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
+        self.start_row, self.start_col = start_sq
+        self.end_row, self.end_col = end_sq
+        piece_moved = board[self.start_row][self.start_col]
+        piece_captured = board[self.end_row][self.end_col]
+        if isCastleMove:
+            self.flags = Move.FLAG_CASTLE
+        elif isEnpassantMove:
+            self.flags = Move.FLAG_ENPASSANT
+            piece_captured = 'bp' if piece_moved == 'wp' else 'wp'
+        elif (piece_moved == 'wp' and self.end_row == 0) or \
+             (piece_moved == 'bp' and self.end_row == 7):
+            self.flags = Move.FLAG_PROMOTION + PROMOTION_CHOICES.index(promotion_choice)
+        else:
+            self.flags = 0
+        self.pieces = MOVE_PIECE_CODES[piece_moved] | MOVE_PIECE_CODES[piece_captured] << 4
+
+    @classmethod
+    def fromId(cls, move_id, board):
+        # Rebuild a move from its packed move_id; pieces are read from board
+        start_sq = move_id & 63
+        end_sq = (move_id >> 6) & 63
+        flags = move_id >> 12
+        return cls((start_sq >> 3, start_sq & 7), (end_sq >> 3, end_sq & 7), board,
+                   isEnpassantMove=flags == Move.FLAG_ENPASSANT,
+                   isCastleMove=flags == Move.FLAG_CASTLE,
+                   promotion_choice=PROMOTION_CHOICES[flags & 3] if flags & Move.FLAG_PROMOTION else 'Q')
+
+    @property
+    def move_id(self):
+        # 16 bits: from square (6) | to square (6) << 6 | flags (4) << 12
+        return ((self.start_row * 8 + self.start_col) |
+                (self.end_row * 8 + self.end_col) << 6 | self.flags << 12)
+
+    @property
+    def piece_moved(self):
+        return MOVE_PIECES[self.pieces & 15]
+
+    @property
+    def piece_captured(self):
+        return MOVE_PIECES[self.pieces >> 4]
+
+    @property
+    def isCastleMove(self):
+        return self.flags == Move.FLAG_CASTLE
+
+    @property
+    def isEnpassantMove(self):
+        return self.flags == Move.FLAG_ENPASSANT
+
+    @property
+    def isPawnPromotion(self):
+        return self.flags >= Move.FLAG_PROMOTION
+
+    @property
+    def isCapture(self):
+        return self.pieces > 15
+
+    @property
+    def promotion_choice(self):
+        return PROMOTION_CHOICES[self.flags & 3] if self.flags >= Move.FLAG_PROMOTION else 'Q'
+
+    @promotion_choice.setter
+    def promotion_choice(self, choice):
+        # Only promotions carry a choice; the GUI sets it after the user picks a piece
+        if self.flags >= Move.FLAG_PROMOTION:
+            self.flags = Move.FLAG_PROMOTION + PROMOTION_CHOICES.index(choice.upper())
 
     def __eq__(self, other):
         if isinstance(other, Move):
@@ -807,7 +1328,7 @@ class Move():
                     self.start_col == other.start_col and
                     self.end_row == other.end_row and
                     self.end_col == other.end_col and
-                    self.piece_moved == other.piece_moved)
+                    self.pieces & 15 == other.pieces & 15)
         return False
 
     def getChessNotation(self):
@@ -838,4 +1359,11 @@ class Move():
         return notation
 
     def getRankFile(self, r, c):
-        return self.cols_to_files[c] + self.rows_to_ranks[r]
\ No newline at end of file
+        return self.cols_to_files[c] + self.rows_to_ranks[r]
+
+    def getUCINotation(self):
+        # Long algebraic form used by UCI engines, e.g. e2e4, e7e8q
+        notation = self.getRankFile(self.start_row, self.start_col) + self.getRankFile(self.end_row, self.end_col)
+        if self.isPawnPromotion:
+            notation += self.promotion_choice.lower()
+        return notation
\ No newline at end of file
@@ -0,0 +1,297 @@
+"""Static evaluation: material plus piece-square tables.
+
+evaluate(gs) scores a single GameState for the built-in search. The batch
+functions score many positions at once with NumPy: positions are packed into
+an (N, 8, 8) int8 array (row 0 = rank 8, white pieces positive, black
+negative) and material, piece-square, mobility and pawn-structure terms are
+computed over the whole array in one pass.
+
+    boards, white_to_move = boardsFromFens(fens)
+    scores = evaluateBatch(boards, white_to_move)
+"""
+try:
+    import numpy as np
+except ImportError:  # evaluate() works without it; the batch functions need it
+    np = None
+
+PIECE_VALUES = {'p': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+
+# Kings use the endgame table once the non-pawn material of both sides is at most this
+ENDGAME_MATERIAL = 1300
+
+# Piece-square tables from white's point of view, row 0 = rank 8 (same layout as GameState.board)
+PIECE_SQUARE_TABLES = {
+    'p': [0, 0, 0, 0, 0, 0, 0, 0,
+          50, 50, 50, 50, 50, 50, 50, 50,
+          10, 10, 20, 30, 30, 20, 10, 10,
+          5, 5, 10, 25, 25, 10, 5, 5,
+          0, 0, 0, 20, 20, 0, 0, 0,
+          5, -5, -10, 0, 0, -10, -5, 5,
+          5, 10, 10, -20, -20, 10, 10, 5,
+          0, 0, 0, 0, 0, 0, 0, 0],
+    'N': [-50, -40, -30, -30, -30, -30, -40, -50,
+          -40, -20, 0, 0, 0, 0, -20, -40,
+          -30, 0, 10, 15, 15, 10, 0, -30,
+          -30, 5, 15, 20, 20, 15, 5, -30,
+          -30, 0, 15, 20, 20, 15, 0, -30,
+          -30, 5, 10, 15, 15, 10, 5, -30,
+          -40, -20, 0, 5, 5, 0, -20, -40,
+          -50, -40, -30, -30, -30, -30, -40, -50],
+    'B': [-20, -10, -10, -10, -10, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 10, 10, 5, 0, -10,
+          -10, 5, 5, 10, 10, 5, 5, -10,
+          -10, 0, 10, 10, 10, 10, 0, -10,
+          -10, 10, 10, 10, 10, 10, 10, -10,
+          -10, 5, 0, 0, 0, 0, 5, -10,
+          -20, -10, -10, -10, -10, -10, -10, -20],
+    'R': [0, 0, 0, 0, 0, 0, 0, 0,
+          5, 10, 10, 10, 10, 10, 10, 5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          0, 0, 0, 5, 5, 0, 0, 0],
+    'Q': [-20, -10, -10, -5, -5, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 5, 5, 5, 0, -10,
+          -5, 0, 5, 5, 5, 5, 0, -5,
+          0, 0, 5, 5, 5, 5, 0, -5,
+          -10, 5, 5, 5, 5, 5, 0, -10,
+          -10, 0, 5, 0, 0, 0, 0, -10,
+          -20, -10, -10, -5, -5, -10, -10, -20],
+    'K': [-30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -20, -30, -30, -40, -40, -30, -30, -20,
+          -10, -20, -20, -20, -20, -20, -20, -10,
+          20, 20, 0, 0, 0, 0, 20, 20,
+          20, 30, 10, 0, 0, 10, 30, 20],
+}
+KING_ENDGAME_TABLE = [-50, -40, -30, -20, -20, -30, -40, -50,
+                      -30, -20, -10, 0, 0, -10, -20, -30,
+                      -30, -10, 20, 30, 30, 20, -10, -30,
+                      -30, -10, 30, 40, 40, 30, -10, -30,
+                      -30, -10, 30, 40, 40, 30, -10, -30,
+                      -30, -10, 20, 30, 30, 20, -10, -30,
+                      -30, -30, 0, 0, 0, 0, -30, -30,
+                      -50, -30, -30, -30, -30, -30, -30, -50]
+
+
+def evaluate(gs):
+    # Material plus piece-square score from the side to move's point of view
+    score = 0
+    non_pawn_material = 0
+    kings = []
+    board = gs.board
+    for r in range(8):
+        row = board[r]
+        for c in range(8):
+            piece = row[c]
+            if piece == '--':
+                continue
+            piece_type = piece[1]
+            if piece_type == 'K':
+                kings.append((piece[0], r, c))
+                continue
+            value = PIECE_VALUES[piece_type]
+            if piece_type != 'p':
+                non_pawn_material += value
+            if piece[0] == 'w':
+                score += value + PIECE_SQUARE_TABLES[piece_type][r * 8 + c]
+            else:
+                score -= value + PIECE_SQUARE_TABLES[piece_type][(7 - r) * 8 + c]
+    king_table = KING_ENDGAME_TABLE if non_pawn_material <= ENDGAME_MATERIAL else PIECE_SQUARE_TABLES['K']
+    for color, r, c in kings:
+        if color == 'w':
+            score += king_table[r * 8 + c]
+        else:
+            score -= king_table[(7 - r) * 8 + c]
+    return score if gs.white_to_move else -score
+
+
+# ---------------------------------------------------------------------------
+# Batch evaluation with NumPy
+# ---------------------------------------------------------------------------
+
+PIECE_TYPES = ('p', 'N', 'B', 'R', 'Q', 'K')  # int8 codes 1..6, negated for black
+PIECE_CODES = {'--': 0}
+for _code, _piece_type in enumerate(PIECE_TYPES, 1):
+    PIECE_CODES['w' + _piece_type] = _code
+    PIECE_CODES['b' + _piece_type] = -_code
+FEN_CODES = {'P': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6,
+             'p': -1, 'n': -2, 'b': -3, 'r': -4, 'q': -5, 'k': -6}
+
+# Centipawns per reachable square (own pieces excluded), and pawn structure terms
+MOBILITY_WEIGHTS = {'N': 4, 'B': 5, 'R': 2, 'Q': 1}
+DOUBLED_PAWN_PENALTY = 15
+ISOLATED_PAWN_PENALTY = 15
+PASSED_PAWN_BONUS = (0, 120, 80, 50, 30, 15, 10, 0)  # by row for white, row 0 = rank 8
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+ORTHOGONAL_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+DIAGONAL_OFFSETS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def _requireNumpy():
+    if np is None:
+        raise ImportError("ChessEvaluation batch functions need numpy (pip install numpy)")
+
+
+def _buildTables():
+    # Lookup tables indexed by [code + 6] or [code + 6, square], signed from white's point of view
+    material = np.zeros(13, dtype=np.int32)
+    non_pawn = np.zeros(13, dtype=np.int32)
+    piece_square = np.zeros((13, 64), dtype=np.int32)
+    king_middle = np.zeros((13, 64), dtype=np.int32)
+    king_end = np.zeros((13, 64), dtype=np.int32)
+    mirror = [(7 - sq // 8) * 8 + sq % 8 for sq in range(64)]
+    for code, piece_type in enumerate(PIECE_TYPES, 1):
+        white, black = 6 + code, 6 - code
+        material[white], material[black] = PIECE_VALUES[piece_type], -PIECE_VALUES[piece_type]
+        if piece_type != 'p':
+            non_pawn[white] = non_pawn[black] = PIECE_VALUES[piece_type]
+        if piece_type == 'K':
+            king_middle[white] = PIECE_SQUARE_TABLES['K']
+            king_middle[black] = [-PIECE_SQUARE_TABLES['K'][m] for m in mirror]
+            king_end[white] = KING_ENDGAME_TABLE
+            king_end[black] = [-KING_ENDGAME_TABLE[m] for m in mirror]
+        else:
+            piece_square[white] = PIECE_SQUARE_TABLES[piece_type]
+            piece_square[black] = [-PIECE_SQUARE_TABLES[piece_type][m] for m in mirror]
+    # FEN byte -> code, 127 for characters that are not pieces
+    fen_bytes = np.full(256, 127, dtype=np.int8)
+    fen_bytes[ord('.')] = 0
+    for symbol, code in FEN_CODES.items():
+        fen_bytes[ord(symbol)] = code
+    return material, non_pawn, piece_square, king_middle, king_end, fen_bytes
+
+
+if np is not None:
+    (_MATERIAL, _NON_PAWN, _PIECE_SQUARE, _KING_MIDDLE,
+     _KING_END, _FEN_BYTES) = _buildTables()
+    _SQUARES = np.arange(64)
+    _ROWS = np.arange(8).reshape(1, 8, 1)
+    _PASSED_WHITE = np.array(PASSED_PAWN_BONUS, dtype=np.int32).reshape(1, 8, 1)
+    _PASSED_BLACK = _PASSED_WHITE[:, ::-1]
+
+# Digits in a FEN rank expand to one '.' per empty square
+_FEN_EXPAND = str.maketrans({str(n): '.' * n for n in range(1, 9)} | {'/': None})
+
+
+def boardsFromGameStates(states):
+    """Pack GameStates into (boards (N, 8, 8) int8, white_to_move (N,) bool)."""
+    _requireNumpy()
+    states = list(states)
+    boards = np.array([[PIECE_CODES[piece] for row in gs.board for piece in row] for gs in states],
+                      dtype=np.int8).reshape(-1, 8, 8)
+    white_to_move = np.array([gs.white_to_move for gs in states], dtype=bool)
+    return boards, white_to_move
+
+
+def boardsFromFens(fens):
+    """Pack FEN strings into (boards (N, 8, 8) int8, white_to_move (N,) bool).
+
+    Only the placement and side-to-move fields are read.
+    """
+    _requireNumpy()
+    placements = []
+    white_to_move = []
+    for fen in fens:
+        fields = fen.split()
+        placement = fields[0].translate(_FEN_EXPAND)
+        if len(placement) != 64 or len(fields) < 2 or fields[1] not in ('w', 'b'):
+            raise ValueError(f"Bad FEN: {fen!r}")
+        placements.append(placement)
+        white_to_move.append(fields[1] == 'w')
+    codes = _FEN_BYTES[np.frombuffer(''.join(placements).encode('ascii'), dtype=np.uint8)]
+    if (codes == 127).any():
+        bad = int(np.argmax((codes == 127).reshape(-1, 64).any(axis=1)))
+        raise ValueError(f"Bad FEN piece in position {bad}")
+    return codes.reshape(-1, 8, 8), np.array(white_to_move, dtype=bool)
+
+
+def _shift(a, dr, dc):
+    # Move every square of an (N, 8, 8) array by (dr, dc); squares pushed off the board are dropped
+    out = np.zeros_like(a)
+    out[:, max(dr, 0):8 + min(dr, 0), max(dc, 0):8 + min(dc, 0)] = \
+        a[:, max(-dr, 0):8 + min(-dr, 0), max(-dc, 0):8 + min(-dc, 0)]
+    return out
+
+
+def _mobility(boards, sign):
+    # Weighted count of squares reachable by one side's knights and sliders, ignoring pins and checks
+    signed = boards * np.int8(sign)
+    own = signed > 0
+    empty = boards == 0
+    targets = ~own
+    knights = np.where(signed == 2, MOBILITY_WEIGHTS['N'], 0).astype(np.int16)
+    reach = np.zeros(boards.shape, dtype=np.int16)  # weighted moves landing on each square
+    for dr, dc in KNIGHT_OFFSETS:
+        reach += _shift(knights, dr, dc) * targets
+    # Sliders in one direction never share a square of their rays, so the weights can travel together
+    rooks = np.where(signed == 4, MOBILITY_WEIGHTS['R'], np.where(signed == 5, MOBILITY_WEIGHTS['Q'], 0))
+    bishops = np.where(signed == 3, MOBILITY_WEIGHTS['B'], np.where(signed == 5, MOBILITY_WEIGHTS['Q'], 0))
+    for sliders, offsets in ((rooks.astype(np.int16), ORTHOGONAL_OFFSETS),
+                             (bishops.astype(np.int16), DIAGONAL_OFFSETS)):
+        for dr, dc in offsets:
+            front = sliders
+            for _ in range(7):
+                front = _shift(front, dr, dc)
+                reach += front * targets
+                front = front * empty
+                if not front.any():
+                    break
+    return reach.sum(axis=(1, 2), dtype=np.int32)
+
+
+def _pawnStructure(boards):
+    white, black = boards == 1, boards == -1
+    white_files, black_files = white.sum(axis=1), black.sum(axis=1)  # (N, 8) pawns per file
+
+    def penalties(files):
+        doubled = np.maximum(files - 1, 0).sum(axis=1)
+        padded = np.pad(files, ((0, 0), (1, 1)))
+        isolated = (files * ((padded[:, :-2] + padded[:, 2:]) == 0)).sum(axis=1)
+        return doubled * DOUBLED_PAWN_PENALTY + isolated * ISOLATED_PAWN_PENALTY
+
+    # A pawn is passed when no enemy pawn stands in front of it on its own or an adjacent file
+    black_front = np.where(black, _ROWS, 8).min(axis=1)
+    padded = np.pad(black_front, ((0, 0), (1, 1)), constant_values=8)
+    black_front = np.minimum(np.minimum(padded[:, :-2], padded[:, 1:-1]), padded[:, 2:])
+    white_passed = white & (black_front[:, None, :] >= _ROWS)
+    white_front = np.where(white, _ROWS, -1).max(axis=1)
+    padded = np.pad(white_front, ((0, 0), (1, 1)), constant_values=-1)
+    white_front = np.maximum(np.maximum(padded[:, :-2], padded[:, 1:-1]), padded[:, 2:])
+    black_passed = black & (white_front[:, None, :] <= _ROWS)
+
+    passed = ((white_passed * _PASSED_WHITE).sum(axis=(1, 2)) -
+              (black_passed * _PASSED_BLACK).sum(axis=(1, 2)))
+    return passed - penalties(white_files) + penalties(black_files)
+
+
+def evaluateBatch(boards, white_to_move=None, terms=False):
+    """Score an (N, 8, 8) int8 array of positions in centipawns.
+
+    Scores are from white's point of view, or from the side to move's when the
+    white_to_move array is given. terms=True returns a dict with the separate
+    'material', 'piece_square', 'mobility', 'pawns' and 'total' arrays.
+    """
+    _requireNumpy()
+    boards = np.asarray(boards, dtype=np.int8).reshape(-1, 8, 8)
+    flat = boards.reshape(-1, 64).astype(np.intp) + 6
+    material = _MATERIAL[flat].sum(axis=1)
+    endgame = _NON_PAWN[flat].sum(axis=1) <= ENDGAME_MATERIAL
+    king = np.where(endgame, _KING_END[flat, _SQUARES].sum(axis=1), _KING_MIDDLE[flat, _SQUARES].sum(axis=1))
+    piece_square = _PIECE_SQUARE[flat, _SQUARES].sum(axis=1) + king
+    mobility = _mobility(boards, 1) - _mobility(boards, -1)
+    pawns = _pawnStructure(boards)
+    total = material + piece_square + mobility + pawns
+    if white_to_move is not None:
+        total = np.where(np.asarray(white_to_move, dtype=bool), total, -total)
+    if terms:
+        return {'material': material, 'piece_square': piece_square, 'mobility': mobility,
+                'pawns': pawns, 'total': total}
+    return total
@@ -1,9 +1,12 @@
 import os
+import sys
+import logging
 import pygame as p
 import ChessEngine
-from SmartMoveFinder import findBestMove, findRandomMove
+from SmartMoveFinder import findBestMove, findRandomMove, prepareSearch, stopSearch, newGame
 import time
 import math
+from concurrent.futures import ThreadPoolExecutor
 
 WIDTH = HEIGHT = 750
 PANEL_WIDTH = 300   # Side panel width
@@ -12,6 +15,8 @@ DIMENSION = 8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 60
 IMAGES = {}
+logger = logging.getLogger(__name__)
+threat_cache = {'key': None, 'squares': []}  # Threatened squares of the last position drawn
 
 def loadImages():
     try:
@@ -38,7 +43,17 @@ def drawPiece(screen, piece, col, row):
                (col * SQ_SIZE + (SQ_SIZE - IMAGES[piece].get_width()) // 2,
                 row * SQ_SIZE + (SQ_SIZE - IMAGES[piece].get_height()) // 2))
 
+def computeAIMove(snapshot, history, moves):
+    # Runs on the AI thread with its own GameState, so the game on screen is never touched
+    gs = ChessEngine.GameState.from_snapshot(snapshot)
+    valid_moves = gs.getValidMoves()
+    if not valid_moves:
+        return None
+    return findBestMove(gs, valid_moves, history, moves).move_id
+
 def main():
+    # Let the pygame loop take the GIL back quickly while the AI thread is searching
+    sys.setswitchinterval(0.001)
     p.init()
     screen = p.display.set_mode((SCREEN_WIDTH, HEIGHT))
     p.display.set_caption('Chess')
@@ -70,6 +85,19 @@ def main():
     vs_computer = False
     buttons = {}
     moves_log = []
+    # One background thread for the AI; ai_future is polled every frame
+    ai_executor = ThreadPoolExecutor(max_workers=1)
+    ai_future = None
+    ai_position = None  # zobrist_key and ply count the pending AI move was asked for
+    stale_future = None  # a cancelled AI move still running until it sees the stop request
+    
+    def cancelAIMove():
+        nonlocal ai_future, stale_future
+        if ai_future is not None:
+            if not ai_future.cancel():
+                stale_future = ai_future
+            stopSearch()
+            ai_future = None
     
     while running:
         current_time = time.time()
@@ -85,6 +113,8 @@ def main():
                 # Check side panel buttons
                 if location[0] > WIDTH:
                     if buttons['reset'].collidepoint(location):
+                        cancelAIMove()
+                        newGame()
                         gs = ChessEngine.GameState()
                         valid_moves = gs.getValidMoves()
                         sq_selected = ()
@@ -99,6 +129,8 @@ def main():
                             winner = "Computer"
                         game_over_text = f"{winner} wins by resignation!"
                         game_over = True
+                        cancelAIMove()
+                        newGame()
                         gs = ChessEngine.GameState()
                         valid_moves = gs.getValidMoves()
                         moves_log = []
@@ -140,7 +172,6 @@ def main():
                                     animation_start_time = current_time
                                     animation_start_pos = (valid_move.start_col, valid_move.start_row)
                                     animation_piece = gs.board[valid_move.start_row][valid_move.start_col]
-                                    gs.board[valid_move.start_row][valid_move.start_col] = '--'
                                 else:
                                     # Regular move handling
                                     animating = True
@@ -148,7 +179,6 @@ def main():
                                     animation_start_time = current_time
                                     animation_start_pos = (valid_move.start_col, valid_move.start_row)
                                     animation_piece = gs.board[valid_move.start_row][valid_move.start_col]
-                                    gs.board[valid_move.start_row][valid_move.start_col] = '--'
                                 
                                 sq_selected = ()
                                 player_clicks = []
@@ -158,11 +188,14 @@ def main():
             
             elif e.type == p.KEYDOWN and not animating:
                 if e.key == p.K_z and not promotion_pending and not game_over:
+                    cancelAIMove()
                     gs.undoMove()
                     if moves_log:
                         moves_log.pop()
                     move_made = True
                 elif e.key == p.K_r:  # Reset game
+                    cancelAIMove()
+                    newGame()
                     gs = ChessEngine.GameState()
                     valid_moves = gs.getValidMoves()
                     sq_selected = ()
@@ -170,6 +203,7 @@ def main():
                     game_over = False
                     promotion_pending = False
                     animating = False
+                    moves_log = []
                 
                 elif promotion_pending and e.key in (p.K_q, p.K_r, p.K_b, p.K_n):
                     if e.key == p.K_q:
@@ -187,19 +221,34 @@ def main():
                     promotion_pending = False
                     promotion_move = None
         
-        # AI move logic
-        if not animating and not game_over and not humanTurn and vs_computer:
-            AImove = findBestMove(gs, valid_moves)
-            if AImove not in valid_moves:
-                AImove = findRandomMove(valid_moves)
-            
-            # Start animation
-            animating = True
-            animation_move = AImove
-            animation_start_time = current_time
-            animation_start_pos = (AImove.start_col, AImove.start_row)
-            animation_piece = gs.board[AImove.start_row][AImove.start_col]
-            gs.board[AImove.start_row][AImove.start_col] = '--'
+        # AI move logic: search in the background, apply the result only if the position is unchanged
+        if not animating and not game_over and not humanTurn and vs_computer and valid_moves:
+            if ai_future is None and (stale_future is None or stale_future.done()):
+                # The stop request is cleared here rather than when the search starts, so a cancel
+                # that comes first is kept; a stale search must finish before it is cleared
+                stale_future = None
+                prepareSearch()
+                ai_position = (gs.zobrist_key, len(gs.move_log))
+                ai_future = ai_executor.submit(computeAIMove, gs.snapshot(), gs.positionHistory(),
+                                               [move.getUCINotation() for move in gs.move_log])
+            elif ai_future is not None and ai_future.done():
+                try:
+                    ai_move_id = ai_future.result()
+                except Exception:
+                    logger.exception("AI move failed, playing a random move")
+                    ai_move_id = None
+                ai_future = None
+                if ai_position == (gs.zobrist_key, len(gs.move_log)):
+                    AImove = next((move for move in valid_moves if move.move_id == ai_move_id), None)
+                    if AImove is None:
+                        AImove = findRandomMove(valid_moves)
+                    
+                    # Start animation
+                    animating = True
+                    animation_move = AImove
+                    animation_start_time = current_time
+                    animation_start_pos = (AImove.start_col, AImove.start_row)
+                    animation_piece = gs.board[AImove.start_row][AImove.start_col]
                 
         # Animation logic
         if animating:
@@ -223,11 +272,6 @@ def main():
                 gs.makeMove(animation_move)
                 moves_log.append(animation_move.getChessNotation())
                 move_made = True
-                if animation_piece[1] == 'K':  # If it was a king
-                    if animation_piece[0] == 'w':
-                        gs.white_king_loc = (animation_move.end_row, animation_move.end_col)
-                    else:
-                        gs.black_king_loc = (animation_move.end_row, animation_move.end_col)
         
         if move_made:
             valid_moves = gs.getValidMoves()
@@ -249,6 +293,9 @@ def main():
 
         clock.tick(MAX_FPS)
         p.display.flip()
+    
+    cancelAIMove()
+    ai_executor.shutdown(wait=False)
 
 
 def draw_side_panel(screen, gs, vs_computer, moves_log):
@@ -376,7 +423,22 @@ def drawGameState(screen, gs, sq_selected, valid_moves, animating=False, animati
                    (current_x - piece_img.get_width()//2, 
                     current_y - piece_img.get_height()//2))
 
+def threatenedSquares(gs):
+    # Pieces of the side to move that lose material to a capture; only recomputed when the position changes
+    if threat_cache['key'] != gs.zobrist_key:
+        threats = gs.threatMap('w' if gs.white_to_move else 'b')
+        threat_cache['squares'] = [square for square, (_, _, threat) in threats.items() if threat > 0]
+        threat_cache['key'] = gs.zobrist_key
+    return threat_cache['squares']
+
 def highlightSquares(screen, gs, sq_selected, valid_moves):
+    # Threatened pieces of the side to move
+    s = p.Surface((SQ_SIZE, SQ_SIZE))
+    s.set_alpha(90)
+    s.fill(p.Color('red'))
+    for r, c in threatenedSquares(gs):
+        screen.blit(s, (c * SQ_SIZE, r * SQ_SIZE))
+
     if sq_selected:
         r, c = sq_selected
         if gs.board[r][c][0] == ('w' if gs.white_to_move else 'b'):
@@ -0,0 +1,161 @@
+"""Perft (move path enumeration) benchmark and regression suite for ChessEngine.
+
+Counts the leaf nodes of the legal move tree with GameState.getValidMoves,
+makeMove and undoMove and compares them with the published reference counts.
+
+    python ChessPerft.py                          # whole suite, list backend
+    python ChessPerft.py -p kiwipete -d 3 --divide
+    python ChessPerft.py --fen "<fen>" -d 4 --backend bitboard --json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+from ChessEngine import GameState, BACKENDS
+
+# name -> (fen, reference node counts for depth 1, 2, 3, ...)
+POSITIONS = {
+    'start': ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+              (20, 400, 8902, 197281, 4865609)),
+    'kiwipete': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+                 (48, 2039, 97862, 4085603)),
+    'position3': ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+                  (14, 191, 2812, 43238, 674624)),
+    'position4': ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+                  (6, 264, 9467, 422333)),
+    'position5': ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+                  (44, 1486, 62379, 2103487)),
+    # En passant and promotion edge cases
+    'illegal-ep': ('8/5bk1/8/2Pp4/8/1K6/8/8 w - d6 0 1',
+                   (8, 104, 736, 9287)),
+    'ep-check': ('8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1',
+                 (15, 126, 1928, 13931)),
+    'promote-out-of-check': ('2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1',
+                             (11, 133, 1442, 19174)),
+    'underpromote-check': ('8/P1k5/K7/8/8/8/8/8 w - - 0 1',
+                           (6, 27, 273, 1329)),
+}
+
+# Depth used per position when running the whole suite
+SUITE_DEPTH = 3
+
+
+def perft(gs, depth):
+    # Leaf nodes at depth; the last ply is counted without building its moves
+    if depth <= 1:
+        return gs.countLegalMoves() if depth == 1 else 1
+    nodes = 0
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+def divide(gs, depth):
+    # Node count below each root move, keyed by UCI notation
+    counts = {}
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        counts[move.getUCINotation()] = perft(gs, depth - 1)
+        gs.undoMove()
+    return counts
+
+
+def runPosition(name, fen, depth, backend='list', expected=(), show_divide=False):
+    gs = GameState.from_fen(fen, backend)
+    result = {
+        'name': name,
+        'fen': fen,
+        'backend': backend,
+        'depths': [],
+        'passed': True,
+    }
+    total_nodes = 0
+    total_seconds = 0.0
+    for d in range(1, depth + 1):
+        start = time.perf_counter()
+        nodes = perft(gs, d)
+        seconds = time.perf_counter() - start
+        reference = expected[d - 1] if d <= len(expected) else None
+        if reference is not None and nodes != reference:
+            result['passed'] = False
+        result['depths'].append({
+            'depth': d,
+            'nodes': nodes,
+            'expected': reference,
+            'seconds': round(seconds, 6),
+            'nps': round(nodes / seconds) if seconds > 0 else None,
+        })
+        total_nodes += nodes
+        total_seconds += seconds
+    result['nodes'] = total_nodes
+    result['seconds'] = round(total_seconds, 6)
+    result['nps'] = round(total_nodes / total_seconds) if total_seconds > 0 else None
+    if show_divide:
+        result['divide'] = divide(gs, depth)
+    return result
+
+
+def printResult(result):
+    status = 'ok' if result['passed'] else 'FAILED'
+    print(f"{result['name']} [{result['backend']}] {status}")
+    print(f"  {result['fen']}")
+    for row in result['depths']:
+        expected = '' if row['expected'] is None else f" (expected {row['expected']})"
+        nps = row['nps'] if row['nps'] is not None else '-'
+        print(f"  depth {row['depth']}: {row['nodes']} nodes{expected} in {row['seconds']:.3f}s, {nps} nps")
+    if 'divide' in result:
+        for move, nodes in sorted(result['divide'].items()):
+            print(f"    {move}: {nodes}")
+        print(f"    moves: {len(result['divide'])}, nodes: {sum(result['divide'].values())}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft benchmark for ChessEngine.GameState")
+    parser.add_argument('-p', '--position', action='append', choices=sorted(POSITIONS),
+                        help="reference position to run (repeatable, default: all)")
+    parser.add_argument('--fen', help="run a custom FEN instead of the reference positions")
+    parser.add_argument('-d', '--depth', type=int, help=f"maximum depth (default: {SUITE_DEPTH})")
+    parser.add_argument('-b', '--backend', choices=BACKENDS, default='list')
+    parser.add_argument('--divide', action='store_true', help="print node counts per root move")
+    parser.add_argument('--json', action='store_true', help="emit machine-readable JSON")
+    args = parser.parse_args(argv)
+
+    depth = args.depth or SUITE_DEPTH
+    if args.fen:
+        runs = [('custom', args.fen, ())]
+    else:
+        names = args.position or list(POSITIONS)
+        runs = [(name,) + POSITIONS[name] for name in names]
+
+    results = [runPosition(name, fen, depth, args.backend, expected, args.divide)
+               for name, fen, expected in runs]
+    total_nodes = sum(r['nodes'] for r in results)
+    total_seconds = sum(r['seconds'] for r in results)
+    summary = {
+        'backend': args.backend,
+        'depth': depth,
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'nodes': total_nodes,
+        'seconds': round(total_seconds, 6),
+        'nps': round(total_nodes / total_seconds) if total_seconds > 0 else None,
+        'passed': all(r['passed'] for r in results),
+        'results': results,
+    }
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        for result in results:
+            printResult(result)
+        print(f"Total: {total_nodes} nodes in {total_seconds:.3f}s, {summary['nps']} nps"
+              f" - {'all passed' if summary['passed'] else 'MISMATCH'}")
+    return 0 if summary['passed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""UCI protocol helpers and an asyncio pool of UCI engine processes.
+
+EnginePool keeps N engine processes (Stockfish or any UCI engine), each with
+its own option set. Callers check an engine out, search with it and check it
+back in; engines that crash or stop answering are restarted, and callers
+beyond max_waiting are turned away instead of queueing without bound.
+
+    async def main():
+        async with EnginePool(['stockfish'], size=4, options={'Threads': 1, 'Hash': 64}) as pool:
+            analysis = await pool.analyse(moves=['e2e4', 'e7e5'], movetime=200)
+            print(analysis.best_move, analysis.lines[0].score_cp)
+
+FakeUCIEngine.py is a small stand-in engine for running the pool without Stockfish:
+
+    EnginePool([sys.executable, 'FakeUCIEngine.py'], size=2)
+"""
+import asyncio
+import contextlib
+from collections import namedtuple
+
+# One line of a search in UCI notation; score_cp is None when the line is a forced mate
+# (mate in moves, negative when the side to move is mated)
+AnalysisLine = namedtuple('AnalysisLine', ('move', 'score_cp', 'mate', 'depth', 'pv'))
+# Result of one search: the move to play, the expected reply and the top lines, best first
+Analysis = namedtuple('Analysis', ('best_move', 'ponder', 'depth', 'lines'))
+
+
+def parseInfoLine(words):
+    # (multipv index, AnalysisLine) for a UCI "info ... score ... pv ..." line, split into words
+    fields = {}
+    i = 1
+    while i < len(words) and words[i] != 'pv':
+        if words[i] == 'score':
+            fields[words[i + 1]] = int(words[i + 2])
+            i += 3
+        else:
+            fields[words[i]] = words[i + 1] if i + 1 < len(words) else None
+            i += 2
+    pv = words[i + 1:]
+    line = AnalysisLine(pv[0], fields.get('cp'), fields.get('mate'), int(fields.get('depth', 0)), pv)
+    return int(fields.get('multipv', 1)), line
+
+
+def positionCommand(fen_position=None, moves=(), then=()):
+    # UCI position command: moves, then the moves in then, played from fen_position
+    # (the standard start position when it is None)
+    command = f"position fen {fen_position}" if fen_position else "position startpos"
+    moves = list(moves or ()) + list(then)
+    if moves:
+        command += " moves " + ' '.join(moves)
+    return command
+
+
+class AnalysisReader():
+    # Collects one search's output; feed() returns the Analysis once the bestmove line arrives
+
+    def __init__(self):
+        self.lines = {}  # multipv index -> latest AnalysisLine
+
+    def feed(self, line):
+        words = line.split()
+        if not words:
+            return None
+        if (words[0] == 'info' and 'pv' in words and 'score' in words
+                and 'lowerbound' not in words and 'upperbound' not in words):
+            index, analysis_line = parseInfoLine(words)
+            self.lines[index] = analysis_line
+        elif words[0] == 'bestmove':
+            best = None if len(words) < 2 or words[1] == '(none)' else words[1]
+            ponder = words[3] if len(words) >= 4 and words[2] == 'ponder' else None
+            lines = [self.lines[index] for index in sorted(self.lines)]
+            if ponder is None and lines and lines[0].move == best and len(lines[0].pv) > 1:
+                ponder = lines[0].pv[1]
+            return Analysis(best, ponder, lines[0].depth if lines else 0, lines)
+        return None
+
+
+class EngineError(Exception):
+    # The engine process died, broke the protocol or did not answer in time
+    pass
+
+
+class PoolBusy(EngineError):
+    # Every engine is checked out and max_waiting callers are already queued
+    pass
+
+
+class UCIEngine():
+    """One UCI engine process driven over asyncio pipes.
+
+    options are sent with setoption after the uci handshake, and again after a
+    restart. Options the engine does not declare are skipped with a warning.
+    """
+
+    def __init__(self, command, options=None, name=None):
+        self.command = list(command)
+        self.options = dict(options or {})
+        self.name = name or self.command[-1]
+        self.process = None
+        self.engine_name = None  # from "id name"
+        self.available_options = set()
+        self.current = {}  # option values last sent to the engine
+        self.broken = False  # set when the engine's state is unknown, e.g. after a timeout
+        self.restarts = 0
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self, timeout=10.0):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL)
+        self.broken = False
+        self.current = {}
+        self.available_options = set()
+        await self.send("uci")
+        for line in await self.readUntil('uciok', timeout):
+            words = line.split()
+            if words[:2] == ['id', 'name']:
+                self.engine_name = ' '.join(words[2:])
+            elif words[:2] == ['option', 'name'] and 'type' in words:
+                self.available_options.add(' '.join(words[2:words.index('type')]))
+        await self.setOptions(self.options)
+        await self.isReady(timeout)
+
+    async def restart(self, timeout=10.0):
+        await self.quit(timeout=1.0)
+        self.restarts += 1
+        await self.start(timeout)
+
+    async def send(self, command):
+        if not self.alive:
+            raise EngineError(f"{self.name}: engine is not running")
+        self.process.stdin.write(command.encode() + b'\n')
+        try:
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise EngineError(f"{self.name}: {e}") from e
+
+    async def readLine(self, timeout=None):
+        try:
+            line = await asyncio.wait_for(self.process.stdout.readline(), timeout)
+        except asyncio.TimeoutError:
+            self.broken = True
+            raise EngineError(f"{self.name}: no answer within {timeout:.1f}s") from None
+        if not line:
+            self.broken = True
+            raise EngineError(f"{self.name}: engine exited")
+        return line.decode().strip()
+
+    async def readUntil(self, first_word, timeout=None):
+        # Lines up to (not including) the first one starting with first_word, all within timeout
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        lines = []
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - loop.time())
+            line = await self.readLine(remaining)
+            if line.split()[:1] == [first_word]:
+                return lines
+            lines.append(line)
+
+    async def isReady(self, timeout=5.0):
+        # Health check: the engine must answer isready with readyok within timeout
+        await self.send("isready")
+        await self.readUntil('readyok', timeout)
+
+    async def setOptions(self, options):
+        changed = False
+        for name, value in options.items():
+            if name not in self.available_options:
+                print(f"{self.name}: engine has no option {name!r}, skipped")
+                continue
+            if self.current.get(name) == value:
+                continue
+            if isinstance(value, bool):
+                value_text = 'true' if value else 'false'
+            else:
+                value_text = str(value)
+            await self.send(f"setoption name {name} value {value_text}")
+            self.current[name] = value
+            changed = True
+        return changed
+
+    async def newGame(self, timeout=5.0):
+        await self.send("ucinewgame")
+        await self.isReady(timeout)
+
+    async def analyse(self, fen=None, moves=None, movetime=500, multipv=None, grace=2.0):
+        """Search a position for movetime milliseconds and return an Analysis.
+
+        moves are UCI moves from fen (or from the start position). The engine is
+        marked broken if it has not answered bestmove within movetime + grace seconds.
+        multipv applies to this search only; otherwise the configured MultiPV is used.
+        """
+        if multipv is not None or 'MultiPV' in self.available_options:
+            # Sent on every search so a per-call value does not stay on a pooled engine
+            effective = self.options.get('MultiPV', 1) if multipv is None else multipv
+            if await self.setOptions({'MultiPV': effective}):
+                await self.isReady()
+        await self.send(positionCommand(fen, moves))
+        await self.send(f"go movetime {int(movetime)}")
+        reader = AnalysisReader()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + movetime / 1000 + grace
+        while True:
+            analysis = reader.feed(await self.readLine(max(0.0, deadline - loop.time())))
+            if analysis is not None:
+                return analysis
+
+    async def quit(self, timeout=1.0):
+        # Ask the engine to quit, killing it if it does not exit within timeout
+        if self.process is None:
+            return
+        if self.alive:
+            with contextlib.suppress(EngineError):
+                await self.send("quit")
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.kill()
+                await self.process.wait()
+        self.process = None
+
+    def kill(self):
+        if self.alive:
+            self.process.kill()
+
+
+class EnginePool():
+    """A fixed set of UCI engine processes shared by concurrent callers.
+
+    options apply to every engine; engine_options optionally holds one dict per
+    engine layered on top (e.g. different Skill Level values). checkout() waits
+    for a free engine; with max_waiting callers already waiting it raises
+    PoolBusy. Engines that died are restarted at checkout, and checkin() health
+    checks each engine so hung ones are killed and restarted on next use.
+    """
+
+    def __init__(self, command, size=2, options=None, engine_options=None,
+                 max_waiting=None, health_timeout=2.0, start_timeout=10.0):
+        engine_options = engine_options or [{}] * size
+        if len(engine_options) != size:
+            raise ValueError("engine_options needs one dict per engine")
+        self.engines = [UCIEngine(command, dict(options or {}, **extra), name=f"engine-{i}")
+                        for i, extra in enumerate(engine_options)]
+        self.max_waiting = size * 4 if max_waiting is None else max_waiting
+        self.health_timeout = health_timeout
+        self.start_timeout = start_timeout
+        self.idle = None
+        self.waiting = 0
+
+    async def start(self):
+        self.idle = asyncio.Queue()
+        await asyncio.gather(*(engine.start(self.start_timeout) for engine in self.engines))
+        for engine in self.engines:
+            self.idle.put_nowait(engine)
+        return self
+
+    async def close(self):
+        await asyncio.gather(*(engine.quit() for engine in self.engines))
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def checkout(self, timeout=None):
+        if self.waiting >= self.max_waiting and self.idle.empty():
+            raise PoolBusy(f"{self.waiting} callers already waiting for an engine")
+        self.waiting += 1
+        try:
+            engine = await asyncio.wait_for(self.idle.get(), timeout)
+        except asyncio.TimeoutError:
+            raise PoolBusy(f"no engine free within {timeout}s") from None
+        finally:
+            self.waiting -= 1
+        if engine.alive and not engine.broken:
+            return engine
+        try:
+            print(f"{engine.name}: restarting")
+            await engine.restart(self.start_timeout)
+        except BaseException:
+            # Failed or cancelled: leave it in the pool; the next checkout tries again
+            engine.kill()
+            engine.broken = True
+            self.idle.put_nowait(engine)
+            raise
+        return engine
+
+    async def checkin(self, engine):
+        # Health check before the engine is reused; a hung or dead engine is killed.
+        # The engine goes back to the pool even if the check is cancelled or times out.
+        healthy = False
+        try:
+            if engine.alive and not engine.broken:
+                await engine.isReady(self.health_timeout)
+                healthy = True
+        except EngineError:
+            pass
+        finally:
+            if not healthy:
+                # An interrupted check may leave readyok unread, so the engine is restarted too
+                engine.kill()
+                engine.broken = True
+            self.idle.put_nowait(engine)
+
+    @contextlib.asynccontextmanager
+    async def engine(self, timeout=None):
+        engine = await self.checkout(timeout)
+        try:
+            yield engine
+        except (EngineError, asyncio.CancelledError):
+            # The engine may still be searching or writing output nobody will read
+            engine.broken = True
+            raise
+        finally:
+            await self.checkin(engine)
+
+    async def analyse(self, fen=None, moves=None, movetime=500, multipv=None, timeout=None):
+        async with self.engine(timeout) as engine:
+            return await engine.analyse(fen, moves, movetime, multipv)
+
+    def stats(self):
+        return {
+            'engines': len(self.engines),
+            'idle': self.idle.qsize() if self.idle else 0,
+            'waiting': self.waiting,
+            'alive': sum(engine.alive for engine in self.engines),
+            'restarts': sum(engine.restarts for engine in self.engines),
+        }
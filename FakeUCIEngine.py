@@ -0,0 +1,114 @@
+"""A minimal UCI engine for exercising ChessUCI.EnginePool without Stockfish.
+
+Plays the first legal move in UCI order (scores are always 0) and supports
+uci, isready, setoption, ucinewgame, position, go (movetime / ponder /
+infinite), stop, ponderhit and quit. Failures can be injected:
+
+    python FakeUCIEngine.py --crash-after 3    # exit on the third go
+    python FakeUCIEngine.py --hang-after 2     # stop answering on the second go
+"""
+import argparse
+import os
+import sys
+import time
+
+from ChessEngine import GameState
+
+OPTIONS = (
+    'option name Threads type spin default 1 min 1 max 512',
+    'option name Hash type spin default 16 min 1 max 33554432',
+    'option name Skill Level type spin default 20 min 0 max 20',
+    'option name MultiPV type spin default 1 min 1 max 500',
+    'option name Ponder type check default false',
+)
+
+
+def say(line):
+    sys.stdout.write(line + '\n')
+    sys.stdout.flush()
+
+
+def parsePosition(words):
+    # "position startpos|fen <6 fields> [moves ...]" -> GameState
+    if words[1] == 'startpos':
+        gs = GameState()
+        rest = words[2:]
+    else:
+        gs = GameState.from_fen(' '.join(words[2:8]))
+        rest = words[8:]
+    if rest[:1] == ['moves']:
+        for uci in rest[1:]:
+            move = next((m for m in gs.getValidMoves() if m.getUCINotation() == uci), None)
+            if move is None:
+                break
+            gs.makeMove(move)
+    return gs
+
+
+def bestMove(gs, options, started):
+    moves = sorted(move.getUCINotation() for move in gs.getValidMoves())
+    elapsed = int((time.perf_counter() - started) * 1000)
+    if not moves:
+        say(f"info depth 0 score {'mate 0' if gs.in_check else 'cp 0'}")
+        say("bestmove (none)")
+        return
+    for index, move in enumerate(moves[:int(options.get('MultiPV', 1))], 1):
+        say(f"info depth 1 seldepth 1 multipv {index} score cp 0 nodes {len(moves)} time {elapsed} pv {move}")
+    say(f"bestmove {moves[0]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake UCI engine for pool testing")
+    parser.add_argument('--delay', type=float, default=0.01, help="seconds a timed search takes at most")
+    parser.add_argument('--crash-after', type=int, help="exit on this go command")
+    parser.add_argument('--hang-after', type=int, help="stop answering on this go command")
+    args = parser.parse_args(argv)
+
+    options = {}
+    gs = GameState()
+    searches = 0
+    pending = None  # start time of a ponder / infinite search waiting for stop or ponderhit
+    for line in sys.stdin:
+        words = line.split()
+        if not words:
+            continue
+        command = words[0]
+        if command == 'uci':
+            say("id name FakeUCIEngine")
+            say("id author chess_game_jinay")
+            for option in OPTIONS:
+                say(option)
+            say("uciok")
+        elif command == 'isready':
+            say("readyok")
+        elif command == 'setoption' and 'value' in words:
+            value_at = words.index('value')
+            options[' '.join(words[2:value_at])] = ' '.join(words[value_at + 1:])
+        elif command == 'ucinewgame':
+            gs = GameState()
+        elif command == 'position':
+            gs = parsePosition(words)
+        elif command == 'go':
+            searches += 1
+            if args.crash_after and searches >= args.crash_after:
+                os._exit(1)
+            if args.hang_after and searches >= args.hang_after:
+                while True:
+                    time.sleep(60)
+            started = time.perf_counter()
+            if 'ponder' in words or 'infinite' in words:
+                pending = started
+                continue
+            movetime = int(words[words.index('movetime') + 1]) if 'movetime' in words else 1000
+            time.sleep(min(args.delay, movetime / 1000))
+            bestMove(gs, options, started)
+        elif command in ('stop', 'ponderhit') and pending is not None:
+            bestMove(gs, options, pending)
+            pending = None
+        elif command == 'quit':
+            break
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,32 @@
 import random
-from stockfish import Stockfish
 import os
 import platform
-from ChessEngine import Move
+import threading
+import time
+from ChessEngine import GameState, Move
+from ChessUCI import Analysis, AnalysisLine, AnalysisReader, positionCommand
+from ChessCache import AnalysisCache
+from ChessPolyglot import PolyglotBook
+from ChessEndgame import EndgameTablebase, DEFAULT_DIRECTORY as DEFAULT_BITBASE_DIRECTORY
+from ChessEvaluation import PIECE_VALUES, evaluate
+
+try:
+    from stockfish import Stockfish
+except ImportError:  # The native engine below still plays without the wrapper
+    Stockfish = None
+
+# Analyses shared across runs; set CHESS_ANALYSIS_CACHE to another file, or to '' for memory only
+DEFAULT_CACHE_PATH = os.environ.get(
+    'CHESS_ANALYSIS_CACHE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analysis_cache.sqlite3'))
+
+# Polyglot opening book played before any search; set CHESS_OPENING_BOOK to use another file
+DEFAULT_BOOK_PATH = os.environ.get(
+    'CHESS_OPENING_BOOK',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.bin'))
 
 class ChessAI:
-    def __init__(self, skill_level=10, time_limit=0.5):
+    def __init__(self, skill_level=10, time_limit=0.5, ponder=True, multipv=3, cache_path=DEFAULT_CACHE_PATH):
         # List of potential Stockfish paths
         stockfish_paths = [
             r"C:\Users\DELL\Desktop\CGG\stockfish.exe.exe",
@@ -23,7 +44,28 @@ class ChessAI:
             ])
         
         self.stockfish = None
+        self.time_limit = time_limit * 1000  # milliseconds, also the native engine's budget
+        # Pondering: search the predicted reply while the opponent thinks
+        self.ponder = ponder
+        self.ponder_engine = None  # 'stockfish' or 'native' while a ponder search runs
+        self.ponder_key = None  # Zobrist key of the position being pondered
+        self.ponder_thread = None
+        self.ponder_result = None
+        self.multipv = multipv  # lines reported in each Analysis
+        self.skill_level = skill_level
+        self.last_analysis = None
+        self.last_source = None  # 'stockfish', 'native' or 'cache': where last_analysis came from
+        # Cached analyses are reused only when searched at least this deep; None means at least
+        # as deep as that engine's last own search got (the native depth depends on time_limit)
+        self.cache_min_depth = {'stockfish': 14, 'native': None}
+        self.reached_depth = {}  # 'stockfish' / 'native' -> depth of that engine's last own search
+        # The SQLite file is opened on the first lookup, so importing this module creates nothing
+        self.cache = AnalysisCache(cache_path or None)
+        # One UCI session per game: ucinewgame is sent before the first search after newGame()
+        self.new_game_pending = True
         success = False
+        if Stockfish is None:
+            stockfish_paths = []
         
         # Try each path
         for path in stockfish_paths:
@@ -41,7 +83,7 @@ class ChessAI:
                 continue
         
         # If all paths failed, try without specifying a path
-        if not success:
+        if not success and Stockfish is not None:
             try:
                 print("Trying to initialize Stockfish without path...")
                 self.stockfish = Stockfish()
@@ -56,40 +98,183 @@ class ChessAI:
         if success and self.stockfish:
             try:
                 self.stockfish.set_skill_level(skill_level)
-                self.time_limit = time_limit * 1000
                 self.stockfish.set_depth(18)
                 self.stockfish.update_engine_parameters({
                     "UCI_Chess960": "false",
                     "Contempt": 0,
-                    "Threads": 4
+                    "Threads": 4,
+                    "MultiPV": multipv
                 })
                 print("Stockfish configured successfully")
             except Exception as e:
                 print(f"Error configuring Stockfish: {e}")
         else:
-            print("WARNING: Stockfish initialization FAILED - will use random moves")
+            print("WARNING: Stockfish initialization FAILED - will use the built-in engine")
 
-    def find_best_move(self, fen_position):
+    def find_best_move(self, fen_position, moves=None):
+        return self.analyse(fen_position, moves).best_move
+
+    def analyse(self, fen_position, moves=None):
+        """Search the position for time_limit and return an Analysis.
+
+        moves is the game so far in UCI notation from the standard start position;
+        when given the engine gets "position startpos moves ..." and keeps its hash
+        and repetition history, otherwise fen_position is sent on its own. The best
+        move and the top multipv lines come from the same MultiPV search.
+        """
         if not self.stockfish:
             raise ValueError("Stockfish is not initialized")
             
         try:
-            self.stockfish.set_fen_position(fen_position)
-            best_move = self.stockfish.get_best_move_time(self.time_limit)
-            
-            # Get top moves to help debug
-            try:
-                top_moves = self.stockfish.get_top_moves(3)
-                if top_moves:
-                    print(f"Top 3 moves: {', '.join([f'{m['Move']} ({m['Centipawn']}cp)' for m in top_moves])}")
-            except Exception as e:
-                print(f"Warning: Couldn't get top moves: {e}")
-                
-            return best_move
+            if self.new_game_pending:
+                self.stockfish._put("ucinewgame")
+                self.new_game_pending = False
+            # A game from the start position is sent as its moves, so the engine sees its history
+            self.stockfish._put(positionCommand(None if moves is not None else fen_position, moves))
+            # get_best_move_time() drops the info lines and the ponder move, so read them here
+            self.stockfish._put(f"go movetime {int(self.time_limit)}")
+            return self.readAnalysis()
         except Exception as e:
             print(f"Stockfish move error: {e}")
             raise
 
+    def newGame(self):
+        # Safe to call from the GUI thread: ucinewgame goes out with the next search,
+        # after any running search or ponder has been read to its bestmove line
+        self.new_game_pending = True
+        self.stopPondering()
+
+    def readAnalysis(self):
+        # Read Stockfish's output up to "bestmove <move> [ponder <move>]"
+        reader = AnalysisReader()
+        while True:
+            analysis = reader.feed(self.stockfish._read_line())
+            if analysis is not None:
+                self.last_analysis = analysis
+                self.last_source = 'stockfish'
+                return analysis
+
+    def cacheParams(self, source):
+        # Search settings that change the result, so analyses under other settings are not mixed
+        if source == 'stockfish':
+            return f"stockfish skill={self.skill_level} multipv={self.multipv}"
+        return source
+
+    def cachedMove(self, gs, valid_moves, history=None):
+        # A cached move for gs, skipped for repeated positions where the game history matters
+        if history is None:
+            history = gs.positionHistory()
+        if gs.zobrist_key in history:
+            return None
+        source = 'stockfish' if self.stockfish else 'native'
+        min_depth = self.cache_min_depth[source]
+        if min_depth is None:
+            min_depth = self.reached_depth.get(source, 0)
+        analysis = self.cache.get(gs.zobrist_key, self.cacheParams(source), min_depth)
+        if analysis is None:
+            return None
+        move = next((m for m in valid_moves if m.getUCINotation() == analysis.best_move), None)
+        if move is None:
+            return None  # Zobrist collision
+        self.last_analysis = analysis
+        self.last_source = 'cache'
+        print(f"Cache hit: {analysis.best_move} (depth {analysis.depth})")
+        return move
+
+    def storeAnalysis(self, gs, move):
+        # Cache the search that produced move; cache hits and fallback moves are not stored
+        analysis = self.last_analysis
+        if self.last_source not in ('stockfish', 'native') or analysis is None:
+            return
+        self.reached_depth[self.last_source] = analysis.depth
+        if analysis.best_move == move.getUCINotation():
+            self.cache.put(gs.zobrist_key, self.cacheParams(self.last_source), analysis)
+
+    def predictedReply(self, move):
+        # The reply the last search expects to our move, in UCI notation
+        analysis = self.last_analysis
+        if analysis and analysis.best_move == move.getUCINotation():
+            return analysis.ponder
+        return None
+
+    def startPondering(self, gs, move, history=None, moves=None):
+        # Start searching the position after move and its predicted reply; gs is not modified
+        if not self.ponder or self.ponder_engine is not None:
+            return
+        reply = self.predictedReply(move)
+        if reply is None:
+            return
+        ponder_gs = GameState.from_snapshot(gs.snapshot(), 'bitboard')
+        for uci in (move.getUCINotation(), reply):
+            played = next((m for m in ponder_gs.getValidMoves() if m.getUCINotation() == uci), None)
+            if played is None:
+                return
+            ponder_gs.makeMove(played)
+        if not ponder_gs.getValidMoves():
+            return  # The predicted reply ends the game
+
+        self.ponder_key = ponder_gs.zobrist_key
+        if self.stockfish:
+            self.ponder_engine = 'stockfish'
+            self.stockfish._put(positionCommand(None if moves is not None else gs.to_fen(), moves,
+                                                (move.getUCINotation(), reply)))
+            self.stockfish._put(f"go ponder movetime {int(self.time_limit)}")
+        else:
+            self.ponder_engine = 'native'
+            if history is None:
+                history = gs.positionHistory()
+            history = list(history) + ponder_gs.positionHistory()
+            native_engine.startPonder()
+            self.ponder_thread = threading.Thread(target=self.ponderNative,
+                                                  args=(ponder_gs, history), daemon=True)
+            self.ponder_thread.start()
+
+    def ponderNative(self, ponder_gs, history):
+        self.ponder_result = native_engine.search(ponder_gs, self.time_limit / 1000,
+                                                  history=history, ponder=True)
+
+    def stopPondering(self):
+        # Safe to call from another thread: the ponder result will not be used
+        self.ponder_key = None
+        native_engine.endPonder()
+
+    def takePonderMove(self, gs, valid_moves, use=True):
+        """End the running ponder search and return its move if gs is the pondered position.
+
+        On a ponderhit the search keeps its work and only runs out the rest of
+        the time limit; on a miss, or with use=False, it is stopped and None is returned.
+        """
+        engine = self.ponder_engine
+        if engine is None:
+            return None
+        hit = use and self.ponder_key is not None and gs.zobrist_key == self.ponder_key
+        self.ponder_engine = None
+        self.ponder_key = None
+
+        if engine == 'stockfish':
+            self.stockfish._put("ponderhit" if hit else "stop")
+            best_move_uci = self.readAnalysis().best_move
+            if not hit or not best_move_uci:
+                return None
+            print(f"Ponderhit: {best_move_uci}")
+            return convert_to_your_move(best_move_uci, gs, valid_moves)
+
+        if hit:
+            native_engine.ponderhit()
+        else:
+            native_engine.endPonder()
+        self.ponder_thread.join()
+        self.ponder_thread = None
+        best_move, info = self.ponder_result
+        self.ponder_result = None
+        if not hit or best_move is None:
+            return None
+        self.last_analysis = nativeAnalysis(best_move, info)
+        self.last_source = 'native'
+        print(f"Ponderhit: depth {info['depth']}, score {info['score']}cp, "
+              f"{info['nodes']} nodes, {info['nps']} nps, pv {' '.join(info['pv'])}")
+        return next((m for m in valid_moves if m.move_id == best_move.move_id), None)
+
 # Global AI instance (initialize once)
 try:
     print("Initializing AI...")
@@ -103,59 +288,8 @@ except Exception as e:
     ai = None
 
 def convert_to_fen(gs):
-    fen_parts = []
-    
-    # 1. Piece placement
-    for row in range(8):
-        empty = 0
-        fen_row = ""
-        for col in range(8):
-            piece = gs.board[row][col]
-            if piece == '--':
-                empty += 1
-            else:
-                if empty > 0:
-                    fen_row += str(empty)
-                    empty = 0
-                # Convert piece notation
-                color, piece_type = piece[0], piece[1]
-                fen_piece = piece_type.upper() if color == 'w' else piece_type.lower()
-                fen_row += fen_piece
-        if empty > 0:
-            fen_row += str(empty)
-        fen_parts.append(fen_row)
-    piece_placement = "/".join(fen_parts)
-    
-    # 2. Active color
-    active_color = 'w' if gs.white_to_move else 'b'
-    
-    # 3. Castling availability
-    castling = []
-    # White kingside
-    if gs.white_castle_kingside:
-        castling.append('K')
-    if gs.white_castle_queenside:
-        castling.append('Q')
-    if gs.black_castle_kingside:
-        castling.append('k')
-    if gs.black_castle_queenside:
-        castling.append('q')
-    castling = "".join(castling) or "-"
-    
-    # 4. En passant
-    ep = "-"
-    if gs.enpassantPossible:
-        row, col = gs.enpassantPossible
-        ep = f"{'abcdefgh'[col]}{8 - row}"
-    
-    # 5. Halfmove clock (estimated from move log)
-    halfmove = "0"
-    
-    # 6. Fullmove number
-    fullmove = str(max(1, len(gs.move_log) // 2 + 1))
-    
-    fen = f"{piece_placement} {active_color} {castling} {ep} {halfmove} {fullmove}"
-    return fen
+    # Kept for existing callers; GameState tracks the halfmove clock and fullmove number itself
+    return gs.to_fen()
 
 def find_castle_move_in_valid_moves(gs, valid_moves, king_row, king_col, target_col):
     # Look for matching castle move in valid moves
@@ -224,18 +358,410 @@ def convert_to_your_move(chess_move, gs, valid_moves):
     
     return None
 
-def findBestMove(gs, valid_moves):
-    if not ai or not ai.stockfish:
+# ---------------------------------------------------------------------------
+# Built-in engine: used when Stockfish is not available
+# ---------------------------------------------------------------------------
+
+MATE_SCORE = 100000
+
+# TT entry bounds
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class NativeEngine:
+    """Negamax alpha-beta with iterative deepening, a transposition table,
+    MVV-LVA / killer / history move ordering and a capture-only quiescence search.
+    """
+
+    def __init__(self, tt_size=200000):
+        self.tt_size = tt_size
+        self.tt = {}  # zobrist_key -> (depth, score, bound, best move_id)
+        self.last_info = {}
+        self.stopped = False
+        self.search_pending = False  # set by prepareSearch() until that search starts
+        self.ponder_stopped = False
+        self.pondering = False
+        self.max_ponder_time = 10.0  # seconds; bounds the TT growth of a long ponder
+
+    def prepareSearch(self):
+        # Called when a search is handed to another thread, before stop() may be called for it,
+        # so that a stop() arriving before the search begins is not lost
+        self.stopped = False
+        self.pondering = False
+        self.search_pending = True
+
+    def stop(self):
+        # Safe to call from another thread; the running search returns its last completed depth,
+        # as does the next one if it was announced with prepareSearch() and has not started yet
+        self.stopped = True
+
+    def startPonder(self):
+        # Called before a ponder search is started on its own thread, so that an
+        # early endPonder() or ponderhit() is not overwritten when the search begins
+        self.ponder_stopped = False
+        self.pondering = True
+
+    def endPonder(self):
+        # End a ponder search whose result will not be used; unlike stop() later searches are not affected
+        self.ponder_stopped = True
+
+    def ponderhit(self):
+        # The predicted move was played: the time limit now applies, counted from the ponder start
+        self.pondering = False
+
+    def timeUp(self):
+        if self.stopped or self.ponder_stopped:
+            return True
+        limit = self.max_ponder_time if self.pondering else self.time_limit
+        return time.perf_counter() - self.start_time > limit
+
+    def search(self, gs, time_limit, max_depth=64, history=None, ponder=False):
+        """Search gs for at most time_limit seconds; return (best Move, info dict).
+
+        gs is searched in place and left as it was found. history holds the Zobrist
+        keys of earlier game positions (default: gs.positionHistory()) for repetitions.
+        ponder=True searches until stop() or ponderhit() (see startPonder).
+        """
+        self.start_time = time.perf_counter()
+        self.time_limit = time_limit
+        if not ponder:
+            if not self.search_pending:
+                self.stopped = False  # Any stop() was meant for an earlier search
+            self.search_pending = False
+            # Only a ponder search that was joined can have set these
+            self.ponder_stopped = False
+            self.pondering = False
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(max_depth + 64)]
+        self.history = {}
+        # Keys of earlier positions in the game, for repetition draws
+        self.path = gs.positionHistory() if history is None else list(history)
+        if len(self.tt) > self.tt_size:
+            self.tt.clear()
+
+        start = self.start_time
+        root_moves = gs.getValidMoves()
+        best_move = root_moves[0] if root_moves else None
+        info = {'depth': 0, 'score': 0, 'nodes': 0, 'nps': 0, 'time': 0.0, 'pv': []}
+        if len(root_moves) > 1:
+            for depth in range(1, max_depth + 1):
+                try:
+                    score, move = self.searchRoot(gs, root_moves, depth)
+                except SearchTimeout:
+                    break
+                best_move = move
+                elapsed = time.perf_counter() - start
+                info = {'depth': depth, 'score': score, 'nodes': self.nodes,
+                        'nps': int(self.nodes / elapsed) if elapsed > 0 else 0,
+                        'time': elapsed, 'pv': self.principalVariation(gs, depth)}
+                if abs(score) >= MATE_SCORE - 1000:
+                    break  # Forced mate found, deeper search will not change the move
+                # Put the best move first for the next iteration
+                root_moves.remove(move)
+                root_moves.insert(0, move)
+        elapsed = time.perf_counter() - start
+        info['nodes'] = self.nodes
+        info['time'] = elapsed
+        info['nps'] = int(self.nodes / elapsed) if elapsed > 0 else 0
+        self.last_info = info
+        return best_move, info
+
+    def searchRoot(self, gs, moves, depth):
+        alpha, beta = -MATE_SCORE - 1, MATE_SCORE + 1
+        best_move = moves[0]
+        root_key = gs.zobrist_key
+        for move in moves:
+            gs.makeMove(move)
+            self.path.append(root_key)
+            try:
+                score = -self.negamax(gs, depth - 1, -beta, -alpha, 1)
+            finally:
+                self.path.pop()
+                gs.undoMove()
+            if score > alpha:
+                alpha = score
+                best_move = move
+        self.tt[gs.zobrist_key] = (depth, alpha, EXACT, best_move.move_id)
+        return alpha, best_move
+
+    def negamax(self, gs, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 255 == 0 and self.timeUp():
+            raise SearchTimeout()
+
+        key = gs.zobrist_key
+        if key in self.path:
+            return 0  # Repetition
+        if depth <= 0:
+            return self.quiescence(gs, alpha, beta, ply)
+
+        alpha_orig = alpha
+        entry = self.tt.get(key)
+        tt_move = None
+        if entry is not None:
+            entry_depth, entry_score, bound, tt_move = entry
+            if entry_depth >= depth:
+                if bound == EXACT:
+                    return entry_score
+                if bound == LOWER_BOUND and entry_score >= beta:
+                    return entry_score
+                if bound == UPPER_BOUND and entry_score <= alpha:
+                    return entry_score
+
+        in_check = gs.inCheck('w' if gs.white_to_move else 'b')
+        if in_check:
+            depth += 1  # Check extension
+
+        best_score = -MATE_SCORE - 1
+        best_move = None
+        self.path.append(key)
+        try:
+            # Staged generation: after an early cutoff the quiet moves are never generated
+            for move in gs.getStagedMoves(tt_move, self.quietOrder(ply)):
+                gs.makeMove(move)
+                try:
+                    score = -self.negamax(gs, depth - 1, -beta, -alpha, ply + 1)
+                finally:
+                    gs.undoMove()
+                if score > best_score:
+                    best_score = score
+                    best_move = move
+                if score > alpha:
+                    alpha = score
+                if alpha >= beta:
+                    if move.piece_captured == '--':
+                        killers = self.killers[ply]
+                        if killers[0] != move.move_id:
+                            killers[1] = killers[0]
+                            killers[0] = move.move_id
+                        history_key = (move.piece_moved, move.end_row * 8 + move.end_col)
+                        self.history[history_key] = self.history.get(history_key, 0) + depth * depth
+                    break
+        finally:
+            self.path.pop()
+
+        if best_move is None:
+            return -MATE_SCORE + ply if in_check else 0
+        if best_score <= alpha_orig:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.tt[key] = (depth, best_score, bound, best_move.move_id)
+        return best_score
+
+    def quiescence(self, gs, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 255 == 0 and self.timeUp():
+            raise SearchTimeout()
+
+        stand_pat = evaluate(gs)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        captures = [move for move in gs.getNoisyMoves()
+                    if move.piece_captured != '--' or move.promotion_choice == 'Q']
+        for move in self.orderMoves(captures, None, ply):
+            gs.makeMove(move)
+            try:
+                score = -self.quiescence(gs, -beta, -alpha, ply + 1)
+            finally:
+                gs.undoMove()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def quietOrder(self, ply):
+        # Sort key for quiet moves: killers of this ply first, then the history table
+        killers = self.killers[ply]
+        history = self.history
+
+        def score(move):
+            move_id = move.move_id
+            if move_id == killers[0]:
+                return 1 << 30
+            if move_id == killers[1]:
+                return 1 << 29
+            return history.get((move.piece_moved, move.end_row * 8 + move.end_col), 0)
+
+        return score
+
+    def orderMoves(self, moves, tt_move, ply):
+        killers = self.killers[ply]
+
+        def score(move):
+            move_id = move.move_id
+            if move_id == tt_move:
+                return 1000000
+            if move.piece_captured != '--':
+                # MVV-LVA: most valuable victim first, cheapest attacker breaks ties
+                return 100000 + PIECE_VALUES[move.piece_captured[1]] * 10 - PIECE_VALUES[move.piece_moved[1]] // 10
+            if move.isPawnPromotion:
+                return 90000 + PIECE_VALUES[move.promotion_choice]
+            if move_id == killers[0]:
+                return 80000
+            if move_id == killers[1]:
+                return 70000
+            return self.history.get((move.piece_moved, move.end_row * 8 + move.end_col), 0)
+
+        return sorted(moves, key=score, reverse=True)
+
+    def principalVariation(self, gs, depth):
+        # Follow best moves stored in the TT
+        pv = []
+        played = 0
+        seen = set()
+        while len(pv) < depth:
+            entry = self.tt.get(gs.zobrist_key)
+            if entry is None or gs.zobrist_key in seen:
+                break
+            seen.add(gs.zobrist_key)
+            move = next((m for m in gs.getValidMoves() if m.move_id == entry[3]), None)
+            if move is None:
+                break
+            pv.append(move.getUCINotation())
+            gs.makeMove(move)
+            played += 1
+        for _ in range(played):
+            gs.undoMove()
+        return pv
+
+
+native_engine = NativeEngine()
+
+
+def loadOpeningBook(path=DEFAULT_BOOK_PATH):
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        book = PolyglotBook(path)
+        print(f"Opening book loaded: {path} ({book.count} entries)")
+        return book
+    except (OSError, ValueError) as e:
+        print(f"Failed to load opening book {path}: {e}")
+        return None
+
+
+opening_book = loadOpeningBook()
+book_mode = 'weighted'  # or 'best' to always play the highest-weighted book move
+
+
+def loadEndgameTablebase(directory=os.environ.get('CHESS_BITBASES', DEFAULT_BITBASE_DIRECTORY)):
+    # Bitbases come from "python ChessEndgame.py generate"; without them findBestMove just searches
+    try:
+        tablebase = EndgameTablebase(directory)
+    except (OSError, ValueError) as e:
+        print(f"Failed to load endgame bitbases from {directory}: {e}")
+        return None
+    if tablebase:
+        print(f"Endgame bitbases loaded: {', '.join(sorted(tablebase.tables))}")
+        return tablebase
+    return None
+
+
+endgame_tablebase = loadEndgameTablebase()
+
+
+def nativeAnalysis(best_move, info):
+    # The native engine searches a single line; express its result as an Analysis
+    score = info['score']
+    mate = None
+    if abs(score) >= MATE_SCORE - 1000:
+        plies = MATE_SCORE - abs(score)
+        mate = (plies + 1) // 2 if score > 0 else -(plies // 2)
+    pv = info['pv'] or [best_move.getUCINotation()]
+    line = AnalysisLine(pv[0], None if mate is not None else score, mate, info['depth'], pv)
+    return Analysis(best_move.getUCINotation(), pv[1] if len(pv) > 1 else None, info['depth'], [line])
+
+
+def findNativeMove(gs, valid_moves, history=None):
+    # Search a bitboard copy of the position so the game's own GameState is untouched
+    if not valid_moves:
         return findRandomMove(valid_moves)
+    time_limit = ai.time_limit / 1000 if ai else 0.5
+    search_gs = GameState.from_snapshot(gs.snapshot(), 'bitboard')
+    if history is None:
+        history = gs.positionHistory()
+    best_move, info = native_engine.search(search_gs, time_limit, history=history)
+    if ai and best_move is not None:
+        ai.last_analysis = nativeAnalysis(best_move, info)
+        ai.last_source = 'native'
+    print(f"Native engine: depth {info['depth']}, score {info['score']}cp, "
+          f"{info['nodes']} nodes, {info['nps']} nps, pv {' '.join(info['pv'])}")
+    if best_move is None:
+        return findRandomMove(valid_moves)
+    for move in valid_moves:
+        if move.move_id == best_move.move_id:
+            return move
+    return findRandomMove(valid_moves)
+
+
+def prepareSearch():
+    # Call when an AI move is handed to another thread: clears the stop request of the last
+    # one, so that stopSearch() stops the new search even if it has not started yet
+    native_engine.prepareSearch()
+
+
+def stopSearch():
+    # Ask a search running on another thread to finish early (Stockfish calls still run to their time limit)
+    native_engine.stop()
+    if ai:
+        ai.stopPondering()
+
+
+def newGame():
+    # Start a new engine session (reset or resign); the engine's hash is kept within a game
+    if ai:
+        ai.newGame()
+
+
+def findBestMove(gs, valid_moves, history=None, moves=None):
+    # history: Zobrist keys of earlier game positions when gs was rebuilt without its move log
+    # moves: the game's moves in UCI notation from the standard start position, if it began there
+    move = opening_book.findMove(gs, valid_moves, book_mode) if opening_book else None
+    if move is not None:
+        print(f"Book move: {move.getUCINotation()}")
+        if ai:
+            ai.takePonderMove(gs, valid_moves, use=False)
+        return move
+    move = endgame_tablebase.bestMove(gs, valid_moves, history) if endgame_tablebase else None
+    if move is not None:
+        print(f"Bitbase move: {move.getUCINotation()}")
+        if ai:
+            ai.takePonderMove(gs, valid_moves, use=False)
+        return move
+    move = ai.takePonderMove(gs, valid_moves) if ai else None
+    if move is None and ai:
+        move = ai.cachedMove(gs, valid_moves, history)
+    if move is None:
+        move = searchBestMove(gs, valid_moves, history, moves)
+    if ai:
+        ai.storeAnalysis(gs, move)
+        ai.startPondering(gs, move, history, moves)
+    return move
+
+
+def searchBestMove(gs, valid_moves, history=None, moves=None):
+    if not ai or not ai.stockfish:
+        return findNativeMove(gs, valid_moves, history)
     
     try:
         # Convert current position to FEN
         fen = convert_to_fen(gs)
         
         # Get best move from Stockfish
-        best_move_uci = ai.find_best_move(fen)
+        best_move_uci = ai.find_best_move(fen, moves)
         if not best_move_uci:
-            return findRandomMove(valid_moves)
+            return findNativeMove(gs, valid_moves, history)
             
         # Convert Stockfish move to our Move format
         move = convert_to_your_move(best_move_uci, gs, valid_moves)
@@ -243,14 +769,14 @@ def findBestMove(gs, valid_moves):
         # If conversion succeeded
         if move:
             # Format the move based on whose turn it is
-            move_str = f"{len(gs.move_log)//2 + 1}.{'W' if gs.white_to_move else 'B'}({best_move_uci})"
+            move_str = f"{gs.fullmove_number}.{'W' if gs.white_to_move else 'B'}({best_move_uci})"
             print(move_str)
             return move
         
-        return findRandomMove(valid_moves)
+        return findNativeMove(gs, valid_moves, history)
     except Exception as e:
         print(f"Error in findBestMove: {e}")
-        return findRandomMove(valid_moves)
+        return findNativeMove(gs, valid_moves, history)
 
 def findRandomMove(valid_moves):
     if not valid_moves:
@@ -0,0 +1,26 @@
+from ChessBatch import analyzeFen, generateMoves
+from ChessEngine import GameState
+
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def test_analyze_fen():
+    result = analyzeFen(START)
+    assert len(result['moves']) == 20
+    assert not result['check'] and not result['checkmate'] and not result['stalemate']
+
+
+def test_bad_fens_reported_in_stream():
+    fens = ['not a fen', 'k7/8/8/8/8/8/8/p6K b - - 0 1', START]
+    results = list(generateMoves(fens, processes=1))
+    assert [result['fen'] for result in results] == fens
+    assert 'error' in results[0] and 'error' in results[1]
+    assert len(results[2]['moves']) == 20
+
+
+def test_move_generation_failure_reported(monkeypatch):
+    def broken(self):
+        raise IndexError("list index out of range")
+    monkeypatch.setattr(GameState, 'getValidMoves', broken)
+    result = analyzeFen(START, backend='list')
+    assert result['fen'] == START and 'move generation failed' in result['error']
@@ -0,0 +1,24 @@
+from ChessCache import AnalysisCache
+from ChessUCI import Analysis, AnalysisLine
+
+ANALYSIS = Analysis('e2e4', 'e7e5', 5, [AnalysisLine('e2e4', 20, None, 5, ['e2e4', 'e7e5'])])
+
+
+def test_file_opened_on_first_use(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    cache = AnalysisCache(str(path))
+    assert not path.exists()
+    cache.put(1, 'native', ANALYSIS)
+    assert path.exists()
+    cache.close()
+    reopened = AnalysisCache(str(path))
+    assert reopened.get(1, 'native', min_depth=4) == ANALYSIS
+    assert reopened.get(1, 'native', min_depth=6) is None
+    reopened.close()
+
+
+def test_unusable_file_falls_back_to_memory(tmp_path, capsys):
+    cache = AnalysisCache(str(tmp_path / 'missing' / 'cache.sqlite3'))
+    cache.put(1, 'native', ANALYSIS)
+    assert cache.get(1, 'native') == ANALYSIS
+    assert "Analysis cache unavailable" in capsys.readouterr().out
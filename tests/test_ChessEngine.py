@@ -0,0 +1,27 @@
+import pytest
+
+from ChessEngine import GameState
+
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+@pytest.mark.parametrize('backend', ['list', 'bitboard'])
+def test_fen_round_trip(backend):
+    fen = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R b KQkq - 3 17'
+    assert GameState.from_fen(fen, backend).to_fen() == fen
+    assert GameState.from_fen(START, backend).to_fen() == GameState(backend).to_fen()
+
+
+@pytest.mark.parametrize('backend', ['list', 'bitboard'])
+@pytest.mark.parametrize('fen', [
+    '8/8/8/8/8/8/8/8 w - - 0 1',  # No kings
+    '8/8/8/8/8/8/8/7K w - - 0 1',  # No black king
+    'kk6/8/8/8/8/8/8/7K w - - 0 1',  # Two black kings
+    'k7/8/8/8/8/8/8/p6K b - - 0 1',  # Black pawn on the first rank
+    'kP6/8/8/8/8/8/8/7K w - - 0 1',  # White pawn on the eighth rank
+    'k7/8/8/8/8/8/8/7K x - - 0 1',  # Bad side to move
+    'k7/8/8/8/8/8/7K w - - 0 1',  # Seven ranks
+])
+def test_from_fen_rejects_impossible_positions(backend, fen):
+    with pytest.raises(ValueError):
+        GameState.from_fen(fen, backend)
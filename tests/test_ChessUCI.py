@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT
+from ChessUCI import EngineError, EnginePool, PoolBusy, positionCommand
+
+FAKE_ENGINE = [sys.executable, os.path.join(ROOT, 'FakeUCIEngine.py')]
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 30))
+
+
+def test_analyse():
+    async def main():
+        async with EnginePool(FAKE_ENGINE, size=2) as pool:
+            return await pool.analyse(moves=['e2e4', 'e7e5'], movetime=50)
+    analysis = run(main())
+    assert analysis.best_move == 'a2a3'
+    assert len(analysis.lines) == 1
+
+
+def test_unknown_option_skipped(capsys):
+    async def main():
+        async with EnginePool(FAKE_ENGINE, size=1, options={'Hash': 32, 'Contempt': 10}) as pool:
+            engine = pool.engines[0]
+            assert engine.current == {'Hash': 32}
+            return await pool.analyse(movetime=50)
+    assert run(main()).best_move is not None
+    assert "no option 'Contempt'" in capsys.readouterr().out
+
+
+def test_multipv_applies_to_one_search():
+    async def main():
+        async with EnginePool(FAKE_ENGINE, size=1, options={'MultiPV': 2}) as pool:
+            wide = await pool.analyse(movetime=50, multipv=4)
+            default = await pool.analyse(movetime=50)
+            return wide, default
+    wide, default = run(main())
+    assert len(wide.lines) == 4
+    assert len(default.lines) == 2
+
+
+def test_pool_busy():
+    async def main():
+        async with EnginePool(FAKE_ENGINE, size=1, max_waiting=1) as pool:
+            async with pool.engine():
+                with pytest.raises(PoolBusy):
+                    await pool.checkout(timeout=0.1)
+                waiter = asyncio.ensure_future(pool.checkout())
+                await asyncio.sleep(0)
+                with pytest.raises(PoolBusy):
+                    await pool.checkout()
+                waiter.cancel()
+            return pool.stats()
+    stats = run(main())
+    assert stats['idle'] == 1
+    assert stats['waiting'] == 0
+
+
+def test_crash_restart():
+    async def main():
+        async with EnginePool(FAKE_ENGINE + ['--crash-after', '2'], size=1) as pool:
+            await pool.analyse(movetime=50)
+            with pytest.raises(EngineError):
+                await pool.analyse(movetime=50)
+            analysis = await pool.analyse(movetime=50)
+            return analysis, pool.stats()
+    analysis, stats = run(main())
+    assert analysis.best_move == 'a2a3'
+    assert stats['restarts'] == 1
+
+
+def test_hang_timeout():
+    async def main():
+        async with EnginePool(FAKE_ENGINE + ['--hang-after', '1'], size=1, health_timeout=0.2) as pool:
+            engine = pool.engines[0]
+            with pytest.raises(EngineError):
+                async with pool.engine() as checked_out:
+                    await checked_out.analyse(movetime=50, grace=0.2)
+            assert engine.broken
+            # The restarted engine hangs on its first search again
+            with pytest.raises(EngineError):
+                await pool.analyse(movetime=50)
+            return pool.stats()
+    stats = run(main())
+    assert stats['restarts'] == 1
+
+
+def test_cancelled_checkin_returns_engine():
+    async def main():
+        async with EnginePool(FAKE_ENGINE + ['--hang-after', '1'], size=1, health_timeout=10) as pool:
+            async def search():
+                async with pool.engine() as engine:
+                    await engine.send(positionCommand())
+                    await engine.send("go movetime 10")
+            task = asyncio.ensure_future(search())
+            await asyncio.sleep(0.5)  # The hung engine keeps checkin waiting for readyok
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return pool.stats(), pool.engines[0].broken
+    stats, broken = run(main())
+    assert stats['idle'] == 1
+    assert broken